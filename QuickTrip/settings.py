@@ -29,7 +29,7 @@ INSTALLED_APPS = [
     'api',
     'common',
     'teams',
-    'users'
+    'users.apps.UsersConfig'
 ]
 
 MIDDLEWARE = [
@@ -43,10 +43,20 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.common.CommonMiddleware",
+    "common.middleware.QueryBudgetMiddleware",
 ]
 
 ROOT_URLCONF = 'QuickTrip.urls'
 
+PASSWORD_PBKDF2_ITERATIONS = 216000
+PASSWORD_ARGON2_TIME_COST = 2
+PASSWORD_HASHERS = [
+    'common.hashers.TunedPBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'common.hashers.TunedArgon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
+
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",},
     {"NAME": "django.contrib.auth.password_validation.MinimumLengthValidator",},
@@ -114,9 +124,63 @@ REST_AUTH_SERIALIZERS = {
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
-        'rest_framework.authentication.BasicAuthentication',
-        'rest_framework.authentication.SessionAuthentication',
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-    )
+        'common.authentication.SchemeDispatchAuthentication',
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'common.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    # Reverse proxies in front of the app; throttles identify clients by the address the outermost
+    # one saw. With 0, X-Forwarded-For is ignored, since clients can set it to anything.
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', '0')),
 }
+
+AUTH_TOKEN_CACHE_SIZE = 10000
+AUTH_TOKEN_CACHE_TTL = 300
+BASIC_AUTH_CACHE_SIZE = 10000
+BASIC_AUTH_CACHE_TTL = 60
+
+PASSWORD_HASHING_WORKERS = 2
+PASSWORD_HASHING_QUEUE_SIZE = 32
+PASSWORD_HASHING_TIMEOUT = 10
+
+EFFECTIVE_SETTINGS_CACHE_SIZE = 10000
+EFFECTIVE_SETTINGS_CACHE_TTL = 300
+
+PASSWORD_RESET_TOKEN_TTL = 600
+
+JWT_REVOCATION_REFRESH_INTERVAL = 30
+
+QUERY_BUDGET_ENABLED = config('QUERY_BUDGET_ENABLED', default=False, cast=bool)
+QUERY_BUDGET_SAMPLE_RATE = config('QUERY_BUDGET_SAMPLE_RATE', default=0.05, cast=float)
+QUERY_BUDGET_REPEAT_LIMIT = 5
+QUERY_BUDGET_MAX_QUERIES = 50
+
+COUNT_CACHE_SIZE = 10000
+COUNT_CACHE_TTL = 60
+COUNT_ESTIMATE_THRESHOLD = 100000
+
+# users.search.DatabaseUserSearchBackend keeps the old ILIKE behaviour
+USER_SEARCH_BACKEND = 'users.search.TrigramUserSearchBackend'
+USER_SEARCH_REBUILD_INTERVAL = 300
+
+# Bulk user imports, consumed by `manage.py run_import_jobs`; a running job whose heartbeat is
+# older than USER_IMPORT_STALE_AFTER seconds is reclaimed and resumed by another worker
+USER_IMPORT_CHUNK_SIZE = 1000
+USER_IMPORT_POLL_INTERVAL = 5
+USER_IMPORT_STALE_AFTER = 300
+
+# Agency/team archive cascades: members are updated ARCHIVE_BATCH_SIZE at a time, and scopes larger
+# than ARCHIVE_SYNC_LIMIT members are queued for `manage.py run_archive_jobs`
+ARCHIVE_BATCH_SIZE = 500
+ARCHIVE_SYNC_LIMIT = 2000
+ARCHIVE_POLL_INTERVAL = 5
+ARCHIVE_STALE_AFTER = 300
+
+# Most values one batch email/team-name availability check may carry
+AVAILABILITY_CHECK_MAX_VALUES = 500
+
+# (attempts, window seconds); point LOGIN_THROTTLE_CACHE at a shared cache to limit across workers
+LOGIN_THROTTLE_CACHE = 'default'
+LOGIN_THROTTLE_ACCOUNT_RATE = (10, 300)
+LOGIN_THROTTLE_IP_RATE = (100, 300)
@@ -0,0 +1,32 @@
+from django.db.models import F
+
+from teams.models import Agency
+from users.effective_settings import get_effective_settings, invalidate_effective_settings
+
+CLAIMS_SCHEMA = 1
+CLAIM_FIELDS = (
+    'claims_version', 'role', 'agency_id', 'team_id', 'currency', 'date_type', 'exclude_carriers',
+    'booking_enabled', 'team_booking', 'virtual_interlining', 'student_and_youth', 'search_endpoint',
+    'booking_endpoint'
+)
+
+
+def build_claims(user_id):
+    effective = get_effective_settings(user_id)
+    claims = {'claims_schema': CLAIMS_SCHEMA}
+    for field in CLAIM_FIELDS:
+        claims[field] = effective[field]
+    return claims
+
+
+def add_claims(token, user_id):
+    for claim, value in build_claims(user_id).items():
+        token[claim] = value
+    return token
+
+
+def bump_claims_version(*agency_ids):
+    agency_ids = [agency_id for agency_id in agency_ids if agency_id]
+    if agency_ids:
+        Agency.objects.filter(id__in=agency_ids).update(claims_version=F('claims_version') + 1)
+        invalidate_effective_settings(*[('agency', agency_id) for agency_id in agency_ids])
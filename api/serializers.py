@@ -1,12 +1,20 @@
 from django.contrib.auth import get_user_model
-from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import update_last_login
 from django.utils.translation import ugettext_lazy as _
-from rest_framework import serializers
-from datetime import datetime, timedelta
+from rest_framework import exceptions, serializers, status
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
 import re
+import time
 
 from common.exception import CustomException
+from common.hashing import make_password, check_password, needs_rehash, rehash_password_async
 from users.models import User
+from users.reset_tokens import find_reset_token
+from users.revocation import revocation_list
+from .claims import add_claims
 
 
 class RegistrationSerializer(serializers.ModelSerializer):
@@ -83,7 +91,9 @@ class LoginSerializer(serializers.Serializer):
 
         try:
             self.user = get_user_model().objects.get(**kwargs)
-            if self.user.check_password(password):
+            if check_password(password, self.user.password):
+                if needs_rehash(self.user.password):
+                    rehash_password_async(self.user, password)
                 if self.user.is_active:
                     attrs['user'] = self.user
                     return attrs
@@ -120,20 +130,16 @@ class ConfirmTokenSerializer(serializers.Serializer):
 
     def validate(self, attrs):
         token = attrs.get("token")
-        if not token or not token.isdigit():
+        if not token:
             raise CustomException(code=10, message=self.error_messages['invalid_token'])
 
-        try:
-            user = User.objects.get(password_reset_token=int(token))
-            if not user.is_active:
-                raise CustomException(code=11, message=self.error_messages['inactive_account'])
-            if user.password_reset_sent_at.replace(tzinfo=None) < datetime.now() - timedelta(minutes=10):
-                raise CustomException(code=12, message=self.error_messages['token_expired'])
+        reset_token = find_reset_token(token)
+        if reset_token is None:
+            raise CustomException(code=10, message=self.error_messages['invalid_token'])
+        if not reset_token.user.is_active:
+            raise CustomException(code=11, message=self.error_messages['inactive_account'])
 
-            return attrs
-        except User.DoesNotExist:
-            pass
-        raise CustomException(code=10, message=self.error_messages['invalid_token'])
+        return attrs
 
 
 class ResetPasswordSerializer(serializers.Serializer):
@@ -149,23 +155,20 @@ class ResetPasswordSerializer(serializers.Serializer):
     def validate(self, attrs):
         token = attrs.get("token")
         password = attrs.get("password")
-        if not token or not token.isdigit():
+        if not token:
             raise CustomException(code=10, message=self.error_messages['invalid_token'])
         if not password or len(password) < 6:
             raise CustomException(code=11, message=self.error_messages['invalid_password'])
 
-        try:
-            user = User.objects.get(password_reset_token=int(token))
-            if user.password_reset_sent_at.replace(tzinfo=None) < datetime.now() - timedelta(minutes=10):
-                raise CustomException(code=12, message=self.error_messages['token_expired'])
-            if not user.is_active:
-                raise CustomException(code=12, message=self.error_messages['inactive_account'])
+        reset_token = find_reset_token(token)
+        if reset_token is None:
+            raise CustomException(code=10, message=self.error_messages['invalid_token'])
+        if not reset_token.user.is_active:
+            raise CustomException(code=12, message=self.error_messages['inactive_account'])
 
-            attrs['password'] = make_password(attrs['password'])
-            return attrs
-        except User.DoesNotExist:
-            pass
-        raise CustomException(code=10, message=self.error_messages['invalid_token'])
+        attrs['user'] = reset_token.user
+        attrs['password'] = make_password(attrs['password'])
+        return attrs
 
 
 class ChangePasswordSerializer(serializers.Serializer):
@@ -190,8 +193,51 @@ class ChangePasswordSerializer(serializers.Serializer):
             raise CustomException(code=11, message=self.error_messages['invalid_password'])
 
         user = User.objects.get(pk=user_id)
-        if user.check_password(current_password):
+        if check_password(current_password, user.password):
             attrs['new_password'] = make_password(attrs['new_password'])
             return attrs
         else:
             raise CustomException(code=10, message=self.error_messages['invalid_current_password'])
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+
+    def validate(self, attrs):
+        # Same checks as LoginSerializer, instead of authenticate(), which would hash on the
+        # request thread and never upgrade outdated hashes.
+        try:
+            user = User.objects.get(**{self.username_field: attrs[self.username_field]})
+        except User.DoesNotExist:
+            user = None
+        if user is not None and check_password(attrs['password'], user.password):
+            if needs_rehash(user.password):
+                rehash_password_async(user, attrs['password'])
+            if user.is_active:
+                self.user = user
+                refresh = self.get_token(user)
+                if jwt_settings.UPDATE_LAST_LOGIN:
+                    update_last_login(None, user)
+                return {'refresh': str(refresh), 'access': str(refresh.access_token)}
+        raise exceptions.AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        # Sub-second, so a login right after a revocation is not mistaken for an older token.
+        # Access tokens minted from this refresh token copy the claim.
+        token['iat'] = time.time()
+        return add_claims(token, user.pk)
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+
+    def validate(self, attrs):
+        if revocation_list.is_revoked(RefreshToken(attrs['refresh'])):
+            raise TokenError(_('Token has been revoked.'))
+        data = super().validate(attrs)
+        access = AccessToken(data['access'])
+        try:
+            data['access'] = str(add_claims(access, access[jwt_settings.USER_ID_CLAIM]))
+        except User.DoesNotExist:
+            raise CustomException(code=10, message=_('User not found.'), status_code=status.HTTP_401_UNAUTHORIZED)
+        return data
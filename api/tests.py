@@ -1,3 +1,139 @@
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import caches
 from django.test import TestCase
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.claims import bump_claims_version
+from common.authentication import basic_cache, token_cache
+from common.hashing import check_password
+from common.throttling import SlidingWindowCounter
+from teams.models import Agency
+from users.effective_settings import merge_parameters, settings_cache
+from users.models import User
+from users.revocation import revocation_list
+
+TOKEN_URL = '/api/v1/token/'
+
+
+class ApiTestCase(TestCase):
+
+    def setUp(self):
+        # Per-process state outlives the rolled-back test transaction.
+        for cache in (basic_cache, token_cache, settings_cache):
+            cache.clear()
+        caches[settings.LOGIN_THROTTLE_CACHE].clear()
+        revocation_list.rebuild()
+        self.agency = Agency.objects.create(name='Acme', claims_version=3)
+        self.other = Agency.objects.create(name='Other', claims_version=8)
+        self.user = User.objects.create(username='ann', email='ann@example.com', first_name='Ann', last_name='Lee',
+                                        agency=self.agency, password=make_password('secret123'))
+        self.client = APIClient()
+
+    def login(self):
+        return self.client.post(TOKEN_URL, {'email': 'ann@example.com', 'password': 'secret123'},
+                                format='json').json()
+
+
+class ClaimsVersionTests(ApiTestCase):
+
+    def test_agency_id_is_ignored_for_regular_users(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.get('/api/v1/token/claims-version/', {'agency_id': self.other.id})
+        self.assertEqual(response.json()['data'], {'agency_id': self.agency.id, 'claims_version': 3})
+
+    def test_superusers_can_read_any_agency(self):
+        self.user.is_superuser = True
+        self.user.save()
+        self.client.force_authenticate(self.user)
+        response = self.client.get('/api/v1/token/claims-version/', {'agency_id': self.other.id})
+        self.assertEqual(response.json()['data']['claims_version'], 8)
+
+
+class TokenTests(ApiTestCase):
+
+    def test_login_rejects_non_object_bodies(self):
+        for body in ([1, 2], 'ann', 3):
+            response = self.client.post(TOKEN_URL, body, format='json')
+            self.assertEqual(response.status_code, 400)
+
+    def test_login_right_after_revocation_is_accepted(self):
+        revocation_list.revoke_user(self.user.id)
+        tokens = self.client.post(TOKEN_URL, {'email': 'ann@example.com', 'password': 'secret123'},
+                                  format='json').json()
+
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + tokens['access'])
+        self.assertEqual(self.client.get('/api/v1/get_user_details/').status_code, 200)
+        response = APIClient().post(TOKEN_URL + 'refresh/', {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_tokens_carry_claims(self):
+        access = AccessToken(self.login()['access'])
+        self.assertEqual((access['claims_version'], access['role'], access['agency_id']), (3, 'agent', self.agency.id))
+
+    def test_login_verifies_through_the_hashing_pool_and_upgrades_old_hashes(self):
+        User.objects.filter(pk=self.user.pk).update(password=make_password('secret123', hasher='pbkdf2_sha1'))
+
+        with mock.patch('api.serializers.check_password', wraps=check_password) as check, \
+                mock.patch('api.serializers.rehash_password_async') as rehash:
+            self.assertIn('access', self.login())
+        self.assertEqual(check.call_count, 1)
+        user, password = rehash.call_args[0]
+        self.assertEqual((user.pk, password), (self.user.pk, 'secret123'))
+
+    def test_inactive_users_and_wrong_passwords_are_rejected(self):
+        response = self.client.post(TOKEN_URL, {'email': 'ann@example.com', 'password': 'wrong'}, format='json')
+        self.assertEqual(response.status_code, 401)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        response = self.client.post(TOKEN_URL, {'email': 'ann@example.com', 'password': 'secret123'}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_failed_logins_are_throttled_per_account(self):
+        attempts, window = settings.LOGIN_THROTTLE_ACCOUNT_RATE
+        for attempt in range(attempts):
+            response = self.client.post(TOKEN_URL, {'email': 'ANN@example.com', 'password': 'wrong'}, format='json')
+            self.assertEqual(response.status_code, 401)
+
+        response = self.client.post(TOKEN_URL, {'email': 'ann@example.com', 'password': 'secret123'}, format='json')
+        self.assertEqual((response.status_code, response.json()['errorCode']), (429, 21))
+
+    def test_forwarded_for_cannot_open_new_ip_buckets(self):
+        counter = SlidingWindowCounter('login:ip', 2, 300, cache_alias=settings.LOGIN_THROTTLE_CACHE)
+        with mock.patch('common.throttling.ip_counter', counter):
+            for index in range(3):
+                response = self.client.post(TOKEN_URL, {'email': 'user%d@example.com' % index, 'password': 'x'},
+                                            format='json', HTTP_X_FORWARDED_FOR='203.0.113.%d' % index)
+        self.assertEqual(response.status_code, 429)
+
+    def test_refresh_picks_up_a_bumped_version(self):
+        tokens = self.login()
+        bump_claims_version(self.agency.id)
+
+        response = self.client.post(TOKEN_URL + 'refresh/', {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(AccessToken(response.json()['access'])['claims_version'], 4)
+
+    def test_tokens_issued_before_revocation_are_rejected(self):
+        tokens = self.login()
+        revocation_list.revoke_user(self.user.id)
+
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + tokens['access'])
+        self.assertEqual(self.client.get('/api/v1/get_user_details/').status_code, 401)
+        response = APIClient().post(TOKEN_URL + 'refresh/', {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+
+class UserDetailsTests(ApiTestCase):
+
+    def test_user_email_is_the_username(self):
+        self.client.force_authenticate(self.user)
+        data = self.client.get('/api/v1/get_user_details/').json()
+        self.assertEqual(data['user_email'], 'ann')
+        self.assertEqual(data['agency'], 'Acme')
+        self.assertFalse(data['view_pnr_pricing'])
 
-# Create your tests here.
+    def test_defaults_are_not_shared_between_users(self):
+        merge_parameters(None)['exclude_carriers']['XX'] = True
+        self.assertEqual(merge_parameters(None)['exclude_carriers'], {})
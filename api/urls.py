@@ -1,9 +1,9 @@
 from django.urls import path, re_path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from .views import UserLoginView, UserRegistrationView, ForgotPasswordView, ConfirmTokenView, ResetPasswordView, \
-    ChangePasswordView, UserLogoutView, UserDetailsView
+    ChangePasswordView, UserLogoutView, UserDetailsView, MetricsView, ClaimsTokenObtainPairView, \
+    ClaimsTokenRefreshView, ClaimsVersionView
 
 app_name = 'api'
 urlpatterns = [
@@ -15,9 +15,11 @@ urlpatterns = [
     path('change-password/', ChangePasswordView.as_view()),
     path('logout/', UserLogoutView.as_view()),
     path('accounts/', include('django.contrib.auth.urls')),
-    path('token/', TokenObtainPairView.as_view()),
-    path('token/refresh/', TokenRefreshView.as_view()),
+    path('token/', ClaimsTokenObtainPairView.as_view()),
+    path('token/refresh/', ClaimsTokenRefreshView.as_view()),
+    path('token/claims-version/', ClaimsVersionView.as_view()),
     path('get_user_details/', UserDetailsView.as_view()), # TODO rename and refactor
+    path('metrics/', MetricsView.as_view()),
     #path('search/'),
     #path('price/'),
     #path('price-map/'),
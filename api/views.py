@@ -1,19 +1,29 @@
 from django.core.exceptions import ObjectDoesNotExist
 from rest_framework import status, permissions
-import uuid
 from rest_framework.generics import CreateAPIView, GenericAPIView
 from rest_framework.response import Response
 from rest_auth.views import LoginView, LogoutView
-from datetime import datetime
-from django.contrib.auth.hashers import make_password
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import RefreshToken, Token
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from rest_framework.decorators import permission_classes
 from rest_framework.permissions import IsAuthenticated
 from .serializers import RegistrationSerializer, ForgotSerializer, ConfirmTokenSerializer, ResetPasswordSerializer, \
-    ChangePasswordSerializer
+    ChangePasswordSerializer, ClaimsTokenObtainPairSerializer, ClaimsTokenRefreshSerializer
 from users.models import User
-
-
-class UserLoginView(LoginView):
+from teams.models import Agency
+from users.effective_settings import get_effective_settings
+from users.reset_tokens import issue_reset_token, find_reset_token
+from users.revocation import revocation_list
+from common.hashing import make_password
+from common import metrics
+from common import middleware as query_budget
+from common.authentication import invalidate_user_credentials
+from common.serializers import IsSuperUser
+from common.throttling import LoginThrottleMixin
+
+
+class UserLoginView(LoginThrottleMixin, LoginView):
     def get_response(self):
         original_response = super().get_response()
 
@@ -52,7 +62,16 @@ class UserRegistrationView(CreateAPIView):
 
 class UserLogoutView(LogoutView):
     def logout(self, request):
+        user_id = request.user.id
+        if isinstance(request.auth, Token):
+            revocation_list.revoke_token(request.auth)
+        if request.data.get('refresh'):
+            try:
+                revocation_list.revoke_token(RefreshToken(request.data.get('refresh')))
+            except TokenError:
+                pass
         super().logout(request)
+        invalidate_user_credentials(user_id)
         return Response({"result": True}, status=status.HTTP_201_CREATED)
 
 
@@ -75,11 +94,7 @@ class ForgotPasswordView(CreateAPIView):
             user = User.objects.get(**kwargs)
             print(user.username)
             if user.is_active:
-                token = uuid.uuid4()
-                print(token)
-                user.password_reset_token = token
-                user.password_reset_sent_at = datetime.now()
-                user.save()
+                token = issue_reset_token(user)
         except ObjectDoesNotExist:
             pass
 
@@ -98,11 +113,9 @@ class ConfirmTokenView(CreateAPIView):
 
     def get(self, request, *args, **kwargs):
         token = request.GET.get('token')
-        try:
-            user = User.objects.get(password_reset_token=token)
-            return Response({"result": True}, status=status.HTTP_201_CREATED)
-        except ObjectDoesNotExist:
+        if find_reset_token(token) is None:
             return Response({"result": False}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"result": True}, status=status.HTTP_201_CREATED)
 
 
 class ResetPasswordView(CreateAPIView):
@@ -110,15 +123,15 @@ class ResetPasswordView(CreateAPIView):
     def get(self, request, *args, **kwargs):
         token = request.GET.get('token')
         password = request.GET.get('password')
-        try:
-            user = User.objects.get(password_reset_token=token)
-            user.password = make_password(password)
-            user.password_reset_sent_at = None
-            user.password_reset_token = None
-            user.save()
-            return Response({"result": True}, status=status.HTTP_201_CREATED)
-        except ObjectDoesNotExist:
+        reset_token = find_reset_token(token)
+        if reset_token is None:
             return Response({"result": False}, status=status.HTTP_404_NOT_FOUND)
+        user = reset_token.user
+        user.password = make_password(password)
+        user.save()
+        user.password_reset_tokens.all().delete()
+        invalidate_user_credentials(user.id)
+        return Response({"result": True}, status=status.HTTP_201_CREATED)
 
 
 class ChangePasswordView(CreateAPIView):
@@ -135,34 +148,80 @@ class ChangePasswordView(CreateAPIView):
         user = request.user
         user.password = serializer.data.get('new_password')
         user.save()
+        invalidate_user_credentials(user.id)
 
         return Response({"result": True}, status=status.HTTP_200_OK)
 
 
+class ClaimsTokenObtainPairView(LoginThrottleMixin, TokenObtainPairView):
+    serializer_class = ClaimsTokenObtainPairSerializer
+
+
+class ClaimsTokenRefreshView(TokenRefreshView):
+    serializer_class = ClaimsTokenRefreshSerializer
+
+
+class ClaimsVersionView(GenericAPIView):
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def get(self, request):
+        agency_id = request.user.agency_id
+        if request.user.is_superuser:
+            agency_id = request.GET.get('agency_id') or agency_id
+        claims_version = Agency.objects.filter(id=agency_id).values_list('claims_version', flat=True).first()
+        return Response(
+            {
+                "result": True,
+                "data": {
+                    "agency_id": agency_id,
+                    "claims_version": claims_version or 0
+                }
+            },
+            status=status.HTTP_200_OK
+        )
+
+
 class UserDetailsView(GenericAPIView):
     permission_classes = (permissions.IsAuthenticated,)
     def get(self, request):
-        user = request.user
+        effective = get_effective_settings(request.user.id)
         user_data = {
-            'user_email': user.username,
-            'first_name': user.first_name,
-            'last_name': user.last_name,
-            'date_type': user.date_type,
-            'currency': user.currency,
-            'student_and_youth': user.student_and_youth,
-            'pcc': user.pcc,
-            'provider': user.provider,
-            'agency': request.user.group,
-            'ticketing_queue': request.user.queue,
-            'is_group_admin': request.user.is_group_admin,
-            'is_superuser': request.user.is_superuser,
-            'booking_disabled': request.user.disable_booking,
-            'virtual_interlining': request.user.virtual_interlining,
-            'view_pnr_pricing': request.user.view_pnr_pricing,
-            'markup_visible': request.user.markup_visible
+            'user_email': effective['username'],
+            'first_name': effective['first_name'],
+            'last_name': effective['last_name'],
+            'date_type': effective['date_type'],
+            'currency': effective['currency'],
+            'student_and_youth': effective['student_and_youth'],
+            'pcc': effective['pcc'],
+            'provider': effective['provider'],
+            'agency': effective['agency_name'],
+            'ticketing_queue': effective['queue'],
+            'is_group_admin': effective['is_agency_admin'],
+            'is_superuser': effective['is_superuser'],
+            'booking_disabled': not effective['booking_enabled'],
+            'virtual_interlining': effective['virtual_interlining'],
+            # No model backs these flags yet; they stay off until one does.
+            'view_pnr_pricing': False,
+            'markup_visible': False
         }
         return Response(user_data, status=status.HTTP_200_OK)
 
+
+class MetricsView(GenericAPIView):
+    permission_classes = IsSuperUser,
+
+    def get(self, request):
+        return Response(
+            {
+                "result": True,
+                "data": {
+                    **metrics.snapshot(),
+                    "query_budget": query_budget.report()
+                }
+            },
+            status=status.HTTP_200_OK
+        )
+
 #class SearchFlightsView(CreateAPIView):
 #    
 #    def post(self, request):
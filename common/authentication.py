@@ -0,0 +1,150 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.crypto import salted_hmac
+from django.utils.translation import ugettext_lazy as _
+from rest_framework import HTTP_HEADER_ENCODING, exceptions
+from rest_framework.authentication import BaseAuthentication, BasicAuthentication, SessionAuthentication, \
+    TokenAuthentication, get_authorization_header
+from rest_framework_simplejwt.authentication import JWTAuthentication, AUTH_HEADER_TYPES
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+from common import metrics
+from common.cache import TTLCache
+from common.hashing import make_password, check_password
+from users.revocation import revocation_list
+
+token_cache = TTLCache('auth_token', settings.AUTH_TOKEN_CACHE_SIZE, settings.AUTH_TOKEN_CACHE_TTL)
+basic_cache = TTLCache('auth_basic', settings.BASIC_AUTH_CACHE_SIZE, settings.BASIC_AUTH_CACHE_TTL)
+
+
+def freeze_instance(instance):
+    return instance._state.db or DEFAULT_DB_ALIAS, tuple(
+        getattr(instance, field.attname) for field in instance._meta.concrete_fields
+    )
+
+
+def thaw_instance(model, frozen):
+    db, values = frozen
+    return model.from_db(db, None, values)
+
+
+def invalidate_user_credentials(*user_ids):
+    tags = [('user', user_id) for user_id in user_ids]
+    token_cache.invalidate_tag(*tags)
+    basic_cache.invalidate_tag(*tags)
+
+
+def invalidate_agency_credentials(*agency_ids):
+    tags = [('agency', agency_id) for agency_id in agency_ids]
+    token_cache.invalidate_tag(*tags)
+    basic_cache.invalidate_tag(*tags)
+
+
+def verified_credential_key(user, password):
+    # The stored hash embeds its salt, so a password change can never hit an old entry.
+    value = '%s$%s$%s' % (user.pk, user.password, password)
+    return salted_hmac('common.authentication.basic', value, algorithm='sha256').hexdigest()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+
+    def authenticate_credentials(self, key):
+        model = self.get_model()
+        cached = token_cache.get(key)
+        if cached is not None:
+            frozen_user, frozen_token = cached
+            user = thaw_instance(model.user.field.related_model, frozen_user)
+            token = thaw_instance(model, frozen_token)
+            token.user = user
+            return user, token
+
+        try:
+            token = model.objects.select_related('user').get(key=key)
+        except model.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+        user = token.user
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+        token_cache.set(
+            key,
+            (freeze_instance(user), freeze_instance(token)),
+            tags=(('user', user.pk), ('agency', user.agency_id))
+        )
+        return user, token
+
+
+class CachedBasicAuthentication(BasicAuthentication):
+
+    def authenticate_credentials(self, userid, password, request=None):
+        user_model = get_user_model()
+        try:
+            user = user_model._default_manager.get_by_natural_key(userid)
+        except user_model.DoesNotExist:
+            make_password(password)
+            raise exceptions.AuthenticationFailed(_('Invalid username/password.'))
+
+        if basic_cache.get(verified_credential_key(user, password)) is None:
+            if not check_password(password, user.password):
+                raise exceptions.AuthenticationFailed(_('Invalid username/password.'))
+            basic_cache.set(
+                verified_credential_key(user, password),
+                True,
+                tags=(('user', user.pk), ('agency', user.agency_id))
+            )
+
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_('Invalid username/password.'))
+        return user, None
+
+
+class RevocationCheckingJWTAuthentication(JWTAuthentication):
+
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        if revocation_list.is_revoked(token):
+            raise InvalidToken({
+                'detail': _('Token has been revoked.'),
+                'messages': []
+            })
+        return token
+
+
+class SchemeDispatchAuthentication(BaseAuthentication):
+    token_backend = CachedTokenAuthentication
+    basic_backend = CachedBasicAuthentication
+    jwt_backend = RevocationCheckingJWTAuthentication
+    session_backend = SessionAuthentication
+
+    def get_backend(self, request):
+        auth = get_authorization_header(request).split()
+        if auth:
+            scheme = auth[0].lower()
+            if scheme == self.token_backend.keyword.lower().encode(HTTP_HEADER_ENCODING):
+                return 'token', self.token_backend()
+            if scheme == b'basic':
+                return 'basic', self.basic_backend()
+            if scheme in (header_type.lower().encode(HTTP_HEADER_ENCODING) for header_type in AUTH_HEADER_TYPES):
+                return 'bearer', self.jwt_backend()
+        return 'session', self.session_backend()
+
+    def authenticate(self, request):
+        scheme, backend = self.get_backend(request)
+        start = time.perf_counter()
+        try:
+            return backend.authenticate(request)
+        except Exception:
+            metrics.incr('auth.%s.failed' % scheme)
+            raise
+        finally:
+            metrics.observe('auth.%s' % scheme, time.perf_counter() - start)
+
+    def authenticate_header(self, request):
+        scheme, backend = self.get_backend(request)
+        if scheme == 'session':
+            return self.token_backend().authenticate_header(request)
+        return backend.authenticate_header(request)
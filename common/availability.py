@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models.functions import Lower
+from django.utils.translation import ugettext_lazy as _
+from rest_framework import status
+
+from common.exception import CustomException
+
+
+def check_batch_size(values):
+    if len(values) > settings.AVAILABILITY_CHECK_MAX_VALUES:
+        raise CustomException(code=26, message=_('Too many values to check at once.'),
+                              status_code=status.HTTP_400_BAD_REQUEST)
+    return values
+
+
+def lower_index_name(model, field):
+    return '%s_%s_lower_idx' % (model._meta.db_table, model._meta.get_field(field).column)
+
+
+def create_lower_index(model, field, using=DEFAULT_DB_ALIAS):
+    """Create the ``LOWER(field)`` index that lets ``taken_values`` use an index scan.
+
+    Django 3.1 cannot declare expression indexes in ``Meta.indexes`` and the
+    migrations are generated per deployment, so this runs from ``post_migrate``.
+    """
+    connection = connections[using]
+    if connection.vendor not in ('postgresql', 'sqlite'):
+        return
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute('CREATE INDEX IF NOT EXISTS %s ON %s (LOWER(%s))' % (
+            quote(lower_index_name(model, field)), quote(model._meta.db_table),
+            quote(model._meta.get_field(field).column)
+        ))
+
+
+def taken_values(queryset, field, values):
+    """Return the lower-cased ``values`` already used in ``field`` of ``queryset``, with one IN query.
+
+    The column needs a ``create_lower_index`` index to avoid a full scan.
+    """
+    lowered = {value.lower() for value in values if isinstance(value, str)}
+    if not lowered:
+        return set()
+    return set(
+        queryset.annotate(normalized=Lower(field)).filter(normalized__in=lowered)
+        .values_list('normalized', flat=True).distinct()
+    )
+
+
+def availability(queryset, field, values):
+    """Map each of ``values`` to whether it is still free, comparing case-insensitively."""
+    taken = taken_values(queryset, field, values)
+    return {value: value.lower() not in taken for value in values}
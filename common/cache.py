@@ -0,0 +1,74 @@
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+from common import metrics
+
+
+class TTLCache(object):
+    """Bounded per-process LRU cache whose entries expire after ``ttl`` seconds.
+
+    Entries can carry tags so that everything derived from one object (a user,
+    an agency...) can be dropped at once with ``invalidate_tag``.
+    """
+
+    def __init__(self, name, maxsize, ttl):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._tags = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[0] < time.monotonic():
+                self._remove(key)
+                item = None
+            if item is None:
+                metrics.incr('cache.%s.miss' % self.name)
+                return default
+            self._data.move_to_end(key)
+        metrics.incr('cache.%s.hit' % self.name)
+        return item[1]
+
+    def set(self, key, value, tags=()):
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (time.monotonic() + self.ttl, value, tuple(tags))
+            for tag in tags:
+                self._tags[tag].add(key)
+            while len(self._data) > self.maxsize:
+                self._remove(next(iter(self._data)))
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+    def invalidate_tag(self, *tags):
+        with self._lock:
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._tags.clear()
+
+    def _remove(self, key):
+        expires, value, tags = self._data.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
@@ -0,0 +1,63 @@
+from django.conf import settings
+from django.db import connections
+from django.utils.translation import ugettext_lazy as _
+from rest_framework import status
+
+from common.cache import TTLCache
+from common.exception import CustomException
+
+EXACT = 'exact'
+CACHED = 'cached'
+ESTIMATE = 'estimate'
+NONE = 'none'
+COUNT_MODES = (EXACT, CACHED, ESTIMATE, NONE)
+
+count_cache = TTLCache('counts', settings.COUNT_CACHE_SIZE, settings.COUNT_CACHE_TTL)
+
+
+def estimate_table_rows(model, using):
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [model._meta.db_table])
+        row = cursor.fetchone()
+    # reltuples is -1 (or 0 on older servers) until the table has been analyzed.
+    if row is None or row[0] <= 0:
+        return None
+    return row[0]
+
+
+class CountProvider(object):
+    """Computes result totals in one of COUNT_MODES.
+
+    ``cached`` memoises exact counts per SQL (so per scope and keyword) for
+    COUNT_CACHE_TTL seconds. ``estimate`` reads the planner's row estimate for
+    unfiltered querysets on PostgreSQL and behaves like ``cached`` otherwise.
+    """
+
+    def __init__(self, mode):
+        if mode not in COUNT_MODES:
+            raise CustomException(code=24, message=_('Invalid count mode.'), status_code=status.HTTP_400_BAD_REQUEST)
+        self.mode = mode
+
+    def count(self, queryset):
+        """Return ``(count, is_estimate)``; count is None in ``none`` mode."""
+        if self.mode == NONE:
+            return None, False
+
+        if self.mode == ESTIMATE and not queryset.query.where:
+            estimate = estimate_table_rows(queryset.model, queryset.db)
+            # Small tables are cheap to count exactly.
+            if estimate is not None and estimate >= settings.COUNT_ESTIMATE_THRESHOLD:
+                return estimate, True
+
+        if self.mode == EXACT:
+            return queryset.count(), False
+
+        key = (queryset.db, str(queryset.query))
+        count = count_cache.get(key)
+        if count is None:
+            count = queryset.count()
+            count_cache.set(key, count, tags=(queryset.model._meta.label,))
+        return count, False
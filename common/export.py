@@ -0,0 +1,86 @@
+import csv
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils.translation import ugettext_lazy as _
+from rest_framework import status
+
+from common.exception import CustomException
+from common.renderers import dumps
+
+EXPORT_CHUNK_SIZE = 2000
+# Spreadsheets evaluate cells starting with these as formulas.
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+# Not "format": DRF reserves that query parameter for renderer negotiation.
+FORMAT_PARAM = 'file_format'
+
+
+class Echo(object):
+
+    def write(self, value):
+        return value
+
+
+def iter_rows(queryset, fields):
+    return queryset.values_list(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def csv_cell(value):
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def stream_csv(queryset, fields):
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    for row in iter_rows(queryset, fields):
+        yield writer.writerow([csv_cell(value) for value in row])
+
+
+def stream_ndjson(queryset, fields):
+    encoder = DjangoJSONEncoder()
+    for row in iter_rows(queryset, fields):
+        yield encoder.encode(dict(zip(fields, row))) + '\n'
+
+
+EXPORT_FORMATS = {
+    'csv': (stream_csv, 'text/csv', 'csv'),
+    'ndjson': (stream_ndjson, 'application/x-ndjson', 'ndjson'),
+}
+
+
+def export_response(request, queryset, fields, filename):
+    """Stream ``fields`` of every row in ``queryset`` without materialising it.
+
+    Annotate related columns onto the queryset (``agency_name=F('agency__name')``)
+    and list them in ``fields`` so each row is a single flat tuple.
+    """
+    file_format = request.GET.get(FORMAT_PARAM, 'ndjson')
+    if file_format not in EXPORT_FORMATS:
+        raise CustomException(code=23, message=_('Unsupported export format.'), status_code=status.HTTP_400_BAD_REQUEST)
+    stream, content_type, extension = EXPORT_FORMATS[file_format]
+
+    response = StreamingHttpResponse(stream(queryset.order_by('id'), list(fields)), content_type=content_type)
+    response['Content-Disposition'] = 'attachment; filename="%s.%s"' % (filename, extension)
+    return response
+
+
+def stream_json_list(key, items):
+    # Same bytes as the API renderer would produce for {"result": true, "data": {key: [...]}}.
+    yield b'{"result":true,"data":{' + dumps(key) + b':['
+    items = iter(items)
+    separator = b''
+    while True:
+        chunk = list(islice(items, EXPORT_CHUNK_SIZE))
+        if not chunk:
+            break
+        # One call per chunk keeps the encoder's per-call overhead off every row.
+        yield separator + dumps(chunk)[1:-1]
+        separator = b','
+    yield b']}}'
+
+
+def json_list_response(key, items, status_code=status.HTTP_200_OK):
+    return StreamingHttpResponse(stream_json_list(key, items), status=status_code, content_type='application/json')
@@ -0,0 +1,10 @@
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, Argon2PasswordHasher
+
+
+class TunedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    iterations = settings.PASSWORD_PBKDF2_ITERATIONS
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    time_cost = settings.PASSWORD_ARGON2_TIME_COST
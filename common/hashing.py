@@ -0,0 +1,161 @@
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model, hashers
+from django.db import connection
+from django.utils.translation import ugettext_lazy as _
+from rest_framework import status
+
+from common import metrics
+from common.exception import CustomException
+
+
+def _init_worker():
+    django.setup()
+
+
+def _make_password(password):
+    return hashers.make_password(password)
+
+
+def _check_password(password, encoded):
+    return hashers.check_password(password, encoded)
+
+
+class HashingService(object):
+    busy_message = _('Server is busy, please retry shortly.')
+
+    def __init__(self, workers, queue_size, timeout):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max(1, workers + queue_size))
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._executor = None
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn keeps the parent's database sockets out of the hashing processes
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker
+                )
+            return self._executor
+
+    def _reset_executor(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def _track(self, delta):
+        with self._lock:
+            self._in_flight += delta
+            in_flight = self._in_flight
+        metrics.set_gauge('hashing.in_flight', in_flight)
+        metrics.set_gauge('hashing.queue_depth', max(0, in_flight - self.workers))
+
+    def _release(self, future):
+        self._track(-1)
+        self._slots.release()
+
+    def submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            metrics.incr('hashing.rejected')
+            raise CustomException(code=20, message=self.busy_message, status_code=status.HTTP_429_TOO_MANY_REQUESTS)
+        self._track(1)
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except (BrokenProcessPool, RuntimeError):
+            self._release(None)
+            raise BrokenProcessPool('Password hashing pool is unavailable.')
+        future.add_done_callback(self._release)
+        return future
+
+    def run(self, fn, *args):
+        name = 'hashing.%s' % fn.__name__.strip('_')
+        if self.workers <= 0:
+            with metrics.timer(name):
+                return fn(*args)
+
+        start = time.perf_counter()
+        try:
+            future = self.submit(fn, *args)
+        except BrokenProcessPool:
+            self._reset_executor()
+            with metrics.timer(name):
+                return fn(*args)
+
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            metrics.incr('hashing.timeout')
+            raise CustomException(code=20, message=self.busy_message, status_code=status.HTTP_429_TOO_MANY_REQUESTS)
+        except BrokenProcessPool:
+            self._reset_executor()
+            return fn(*args)
+        finally:
+            metrics.observe(name, time.perf_counter() - start)
+
+    def shutdown(self):
+        self._reset_executor()
+
+
+hashing_service = HashingService(
+    settings.PASSWORD_HASHING_WORKERS,
+    settings.PASSWORD_HASHING_QUEUE_SIZE,
+    settings.PASSWORD_HASHING_TIMEOUT
+)
+
+
+def make_password(password):
+    return hashing_service.run(_make_password, password)
+
+
+def check_password(password, encoded):
+    if password is None or not encoded:
+        return False
+    return hashing_service.run(_check_password, password, encoded)
+
+
+_rehash_executor = ThreadPoolExecutor(max_workers=1)
+_rehash_slots = threading.BoundedSemaphore(max(1, settings.PASSWORD_HASHING_QUEUE_SIZE))
+
+
+def needs_rehash(encoded):
+    preferred = hashers.get_hasher('default')
+    try:
+        hasher = hashers.identify_hasher(encoded)
+    except ValueError:
+        return False
+    return hasher.algorithm != preferred.algorithm or preferred.must_update(encoded)
+
+
+def _rehash(user_id, password, encoded):
+    try:
+        rehashed = make_password(password)
+        updated = get_user_model().objects.filter(pk=user_id, password=encoded).update(password=rehashed)
+        metrics.incr('hashing.rehashed', updated)
+    except Exception:
+        metrics.incr('hashing.rehash_failed')
+    finally:
+        connection.close()
+        _rehash_slots.release()
+
+
+def rehash_password_async(user, password):
+    # Opportunistic: under load the upgrade is skipped and retried on a later login.
+    if not _rehash_slots.acquire(blocking=False):
+        metrics.incr('hashing.rehash_skipped')
+        return
+    _rehash_executor.submit(_rehash, user.pk, password, user.password)
+
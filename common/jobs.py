@@ -0,0 +1,36 @@
+import os
+import socket
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def worker_name():
+    return '%s:%d' % (socket.gethostname(), os.getpid())
+
+
+def claim_job(jobs, worker, stale_after):
+    """Lock the oldest queued job in ``jobs``, or a running one whose worker stopped heartbeating.
+
+    ``jobs`` is a queryset over a model with the ``status``/``worker``/``heartbeat_at``/
+    ``started_at`` job fields; ``SKIP LOCKED`` lets several workers share the table as a queue.
+    """
+    model = jobs.model
+    stale = timezone.now() - timedelta(seconds=stale_after)
+    with transaction.atomic():
+        job = jobs.select_for_update(skip_locked=True, of=('self',)).filter(
+            Q(status=model.QUEUED) | Q(status=model.RUNNING, heartbeat_at__lt=stale)
+        ).order_by('id').first()
+        if job is None:
+            return None
+        now = timezone.now()
+        job.status, job.worker, job.heartbeat_at = model.RUNNING, worker, now
+        job.started_at = job.started_at or now
+        job.save(update_fields=['status', 'worker', 'heartbeat_at', 'started_at'])
+    return job
@@ -0,0 +1,47 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+
+from common.hashing import HashingService, _check_password
+
+BENCHMARK_PASSWORD = 'benchmark-password'
+
+
+class Command(BaseCommand):
+    help = 'Measure login (check_password) throughput against the size of the password hashing pool.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', default='0,1,2,4',
+                            help='Comma separated pool sizes to try, 0 hashes on the request thread.')
+        parser.add_argument('--logins', type=int, default=100)
+        parser.add_argument('--concurrency', type=int, default=16, help='Number of concurrent request threads.')
+
+    def handle(self, *args, **options):
+        encoded = make_password(BENCHMARK_PASSWORD)
+        logins = options['logins']
+        concurrency = options['concurrency']
+
+        self.stdout.write('%8s %12s %10s %10s' % ('workers', 'logins/s', 'p50 ms', 'p95 ms'))
+        for workers in [int(value) for value in options['workers'].split(',')]:
+            service = HashingService(workers, queue_size=concurrency, timeout=600)
+            service.run(_check_password, BENCHMARK_PASSWORD, encoded)
+
+            def login(_):
+                start = time.perf_counter()
+                service.run(_check_password, BENCHMARK_PASSWORD, encoded)
+                return time.perf_counter() - start
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as threads:
+                latencies = sorted(threads.map(login, range(logins)))
+            elapsed = time.perf_counter() - start
+            service.shutdown()
+
+            self.stdout.write('%8d %12.1f %10.1f %10.1f' % (
+                workers,
+                logins / elapsed,
+                latencies[len(latencies) // 2] * 1000,
+                latencies[int(len(latencies) * 0.95) - 1] * 1000
+            ))
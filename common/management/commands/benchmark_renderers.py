@@ -0,0 +1,62 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from common.renderers import FastJSONRenderer
+from common.serializers import USER_PLAN
+from teams.models import Agency, Team
+from teams.views import SEARCH_AGENCY_PLAN, SEARCH_TEAM_PLAN
+from users.models import User
+from users.views import SEARCH_USER_PLAN
+
+
+class Command(BaseCommand):
+    help = "Compare DRF's JSONRenderer with FastJSONRenderer on payloads built from this database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=5000, help='Maximum rows per payload.')
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def payloads(self, limit):
+        now = timezone.now()
+        teams = Team.objects.order_by('-id')[:limit]
+        return [
+            ('users list', {"result": True, "data": {
+                "users": list(USER_PLAN.iterate(User.objects.order_by('id')[:limit], 2000))
+            }}),
+            ('user search', {"result": True, "data": {
+                "users": SEARCH_USER_PLAN.serialize(User.objects.order_by('-id')[:limit])
+            }}),
+            ('team search', {"result": True, "data": {"teams": SEARCH_TEAM_PLAN.serialize(teams)}}),
+            ('agency search', {"result": True, "data": {
+                "agency": SEARCH_AGENCY_PLAN.serialize(Agency.objects.order_by('-id')[:limit])
+            }}),
+            # Member ids as lazy values_list querysets, as the views used to return them.
+            ('team members (querysets)', {"result": True, "data": {"teams": [
+                {"team_id": team.id, "members": User.objects.filter(team=team).values_list('id', flat=True)}
+                for team in teams[:200]
+            ]}}),
+            ('reset tokens (uuid)', {"result": True, "data": [
+                {"reset_token": uuid.uuid4(), "expires_at": now} for _ in range(limit)
+            ]}),
+        ]
+
+    def measure(self, renderer, payload, repeat):
+        renderer.render(payload)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            body = renderer.render(payload)
+        return (time.perf_counter() - start) / repeat * 1000, body
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        self.stdout.write('%-26s %10s %10s %10s %8s %10s' % ('payload', 'bytes', 'drf ms', 'fast ms', 'speedup', 'identical'))
+        for name, payload in self.payloads(options['limit']):
+            drf_ms, drf_body = self.measure(JSONRenderer(), payload, repeat)
+            fast_ms, fast_body = self.measure(FastJSONRenderer(), payload, repeat)
+            self.stdout.write('%-26s %10d %10.2f %10.2f %7.1fx %10s' % (
+                name, len(drf_body), drf_ms, fast_ms, drf_ms / fast_ms if fast_ms else 0, drf_body == fast_body
+            ))
@@ -0,0 +1,65 @@
+import math
+import time
+
+from django.contrib.auth.hashers import get_hashers
+from django.core.management.base import BaseCommand
+
+CALIBRATION_PASSWORD = 'calibration-password'
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the configured PASSWORD_HASHERS on this machine and recommend costs for a latency target.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target-ms', type=float, default=250, help='Target hash latency in milliseconds.')
+        parser.add_argument('--percentile', type=float, default=95)
+        parser.add_argument('--samples', type=int, default=10)
+
+    def measure(self, hasher, samples, percentile):
+        timings = []
+        for _ in range(samples):
+            salt = hasher.salt()
+            start = time.perf_counter()
+            hasher.encode(CALIBRATION_PASSWORD, salt)
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        index = min(len(timings) - 1, int(math.ceil(percentile / 100.0 * len(timings))) - 1)
+        return timings[index] * 1000
+
+    def handle(self, *args, **options):
+        target = options['target_ms']
+        percentile = options['percentile']
+        self.stdout.write('Target p%g: %.0f ms' % (percentile, target))
+
+        for hasher in get_hashers():
+            name = '%s.%s' % (hasher.__module__, hasher.__class__.__name__)
+            try:
+                if getattr(hasher, 'library', None):
+                    hasher._load_library()
+                elapsed = self.measure(hasher, options['samples'], percentile)
+            except ValueError as exc:
+                self.stdout.write('%s: skipped (%s)' % (name, exc))
+                continue
+
+            scale = target / elapsed if elapsed else 1
+            if hasattr(hasher, 'iterations'):
+                current, setting = hasher.iterations, 'iterations'
+                recommended = max(1000, int(round(hasher.iterations * scale, -3)))
+            elif hasattr(hasher, 'time_cost'):
+                current, setting = hasher.time_cost, 'time_cost'
+                recommended = max(1, int(round(hasher.time_cost * scale)))
+            elif hasattr(hasher, 'rounds'):
+                current, setting = hasher.rounds, 'rounds'
+                recommended = max(4, hasher.rounds + int(round(math.log(scale, 2))))
+            else:
+                self.stdout.write('%s: p%g %.1f ms, no tunable cost' % (name, percentile, elapsed))
+                continue
+
+            self.stdout.write('%s: p%g %.1f ms at %s=%s, recommended %s=%s' % (
+                name, percentile, elapsed, setting, current, setting, recommended
+            ))
+
+        self.stdout.write(
+            'Apply with PASSWORD_PBKDF2_ITERATIONS / PASSWORD_ARGON2_TIME_COST; '
+            'existing hashes are upgraded on the next successful login.'
+        )
@@ -0,0 +1,73 @@
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+# Counters are per worker process; every worker reports its own view.
+SAMPLE_SIZE = 2048
+
+_lock = threading.Lock()
+_counters = defaultdict(int)
+_gauges = {}
+_timings = defaultdict(lambda: deque(maxlen=SAMPLE_SIZE))
+
+
+def incr(name, value=1):
+    with _lock:
+        _counters[name] += value
+
+
+def set_gauge(name, value):
+    with _lock:
+        _gauges[name] = value
+
+
+def observe(name, seconds):
+    with _lock:
+        _counters[name + '.count'] += 1
+        _timings[name].append(seconds)
+
+
+@contextmanager
+def timer(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start)
+
+
+def _percentile(samples, q):
+    index = min(len(samples) - 1, int(round(q * (len(samples) - 1))))
+    return samples[index]
+
+
+def snapshot():
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        timings = {name: sorted(samples) for name, samples in _timings.items()}
+
+    summary = {}
+    for name, samples in timings.items():
+        if not samples:
+            continue
+        summary[name] = {
+            "count": counters.get(name + '.count', 0),
+            "p50_ms": round(_percentile(samples, 0.50) * 1000, 3),
+            "p95_ms": round(_percentile(samples, 0.95) * 1000, 3),
+            "p99_ms": round(_percentile(samples, 0.99) * 1000, 3),
+            "max_ms": round(samples[-1] * 1000, 3),
+        }
+    return {
+        "counters": counters,
+        "gauges": gauges,
+        "timings": summary
+    }
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _timings.clear()
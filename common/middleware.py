@@ -0,0 +1,115 @@
+import logging
+import random
+import re
+import threading
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from common import metrics
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r'\s+')
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LISTS = re.compile(r'\bIN \((?:[^()]*)\)', re.IGNORECASE)
+
+_lock = threading.Lock()
+_endpoints = defaultdict(lambda: {
+    "requests": 0,
+    "queries": 0,
+    "max_queries": 0,
+    "flagged": 0,
+    "repeated": Counter(),
+})
+
+
+def fingerprint(sql):
+    sql = _LITERALS.sub('?', sql)
+    sql = _IN_LISTS.sub('IN (...)', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    func = getattr(match.func, 'view_class', match.func)
+    return '%s.%s' % (func.__module__, func.__qualname__)
+
+
+def report(top=5):
+    with _lock:
+        endpoints = {name: dict(stats, repeated=stats['repeated'].most_common(top)) for name, stats in _endpoints.items()}
+
+    for stats in endpoints.values():
+        stats['avg_queries'] = round(stats['queries'] / stats['requests'], 2) if stats['requests'] else 0
+        stats['repeated'] = [{"fingerprint": sql, "count": count} for sql, count in stats['repeated']]
+    return endpoints
+
+
+def reset():
+    with _lock:
+        _endpoints.clear()
+
+
+class QueryRecorder(object):
+
+    def __init__(self):
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        self.fingerprints[fingerprint(sql)] += 1
+        return execute(sql, params, many, context)
+
+
+class QueryBudgetMiddleware(object):
+    """Samples requests, counts their SQL by shape and flags endpoints that repeat
+    the same query more than QUERY_BUDGET_REPEAT_LIMIT times (the usual N+1 shape)
+    or exceed QUERY_BUDGET_MAX_QUERIES in total. See ``report()`` for the results.
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERY_BUDGET_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = settings.QUERY_BUDGET_SAMPLE_RATE
+        self.repeat_limit = settings.QUERY_BUDGET_REPEAT_LIMIT
+        self.max_queries = settings.QUERY_BUDGET_MAX_QUERIES
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+
+        self.record(view_name(request), recorder.fingerprints)
+        return response
+
+    def record(self, endpoint, fingerprints):
+        total = sum(fingerprints.values())
+        repeated = {sql: count for sql, count in fingerprints.items() if count > self.repeat_limit}
+        flagged = bool(repeated) or total > self.max_queries
+
+        with _lock:
+            stats = _endpoints[endpoint]
+            stats['requests'] += 1
+            stats['queries'] += total
+            stats['max_queries'] = max(stats['max_queries'], total)
+            stats['repeated'].update(repeated)
+            if flagged:
+                stats['flagged'] += 1
+
+        if flagged:
+            metrics.incr('query_budget.flagged')
+            logger.warning(
+                'Query budget exceeded by %s: %d queries, repeated shapes: %s',
+                endpoint, total, sorted(repeated.items(), key=lambda item: -item[1])[:3]
+            )
@@ -14,11 +14,13 @@ class CommonParameters(models.Model):
     class Meta:
         db_table = 'common_parameters'
 
-    currency = models.CharField(max_length=3)
-    date_type = models.CharField(max_length=10)
-    booking_enabled = models.BooleanField(default=True)
-    virtual_interlining = models.BooleanField(default=True)
-    exclude_carriers = JSONField(max_length=255, default=dict, blank=True)
+    # Agencies hold a full row; users and teams only get one once they override something, and a
+    # NULL field inherits user -> team -> agency (resolved by users.effective_settings).
+    currency = models.CharField(max_length=3, null=True)
+    date_type = models.CharField(max_length=10, null=True)
+    booking_enabled = models.BooleanField(null=True)
+    virtual_interlining = models.BooleanField(null=True)
+    exclude_carriers = JSONField(max_length=255, null=True, blank=True)
     DATE_CHOICES = ("USA", "UK", "CAD", "INR")
 
     def __str__(self):
@@ -0,0 +1,140 @@
+import base64
+import binascii
+import json
+
+from django.utils.translation import ugettext_lazy as _
+from rest_framework import status
+
+from common.counting import CountProvider, EXACT, NONE
+from common.exception import CustomException
+from common.renderers import dumps
+from common.sorting import ID_DESC, parse_bound
+
+TRUE_VALUES = ('1', 'true', 'yes')
+FALSE_VALUES = ('0', 'false', 'no')
+
+
+def encode_cursor(direction, value, pk):
+    return base64.urlsafe_b64encode(dumps([direction, value, pk])).decode().rstrip('=')
+
+
+def decode_cursor(cursor, sort=ID_DESC):
+    """Return ``(direction, (value, pk))``, with ``value`` parsed back for the sort field."""
+    invalid = CustomException(code=22, message=_('Invalid cursor.'), status_code=status.HTTP_400_BAD_REQUEST)
+    try:
+        direction, value, pk = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise invalid
+    bound = parse_bound(sort, value, pk)
+    if direction not in ('next', 'prev') or bound is None:
+        raise invalid
+    return direction, bound
+
+
+class Pagination(object):
+    """Offset paging by default; ``?paging=cursor`` (or any ``cursor``) switches to keyset
+    paging with opaque ``next``/``prev`` cursors over ``(sort value, id)``.
+
+    ``sort`` is a ``common.sorting.Sort``, ``id DESC`` unless the view resolved one.
+
+    ``?count=`` picks how the total is computed (see ``common.counting``); ``true``
+    means the endpoint's ``count_mode`` and ``false`` means none. Cursor paging
+    skips the total unless asked.
+    """
+
+    def __init__(self, request, count_mode=EXACT, sort=ID_DESC):
+        params = request.GET
+        self.sort = sort
+        self.cursor = params.get('cursor')
+        self.cursor_mode = params.get('paging') == 'cursor' or self.cursor is not None
+        self.page = params.get('page')
+        self.per_page = int(params.get('per_page'))
+        count = (params.get('count') or '').lower()
+        if not count:
+            count = NONE if self.cursor_mode else count_mode
+        elif count in TRUE_VALUES:
+            count = count_mode
+        elif count in FALSE_VALUES:
+            count = NONE
+        self.counter = CountProvider(count)
+        self.count = None
+        self.is_estimate = False
+        self.next = None
+        self.prev = None
+
+    def _count(self, queryset):
+        self.count, self.is_estimate = self.counter.count(queryset)
+
+    def _page_number(self):
+        try:
+            return int(self.page)
+        except (TypeError, ValueError):
+            return 1
+
+    def _keyset(self, fetch):
+        # fetch(bound, reverse, limit) returns (pk, sort value, ...) rows that come after
+        # bound, in the sort order or, with reverse, against it.
+        limit = self.per_page + 1
+        direction, bound = decode_cursor(self.cursor, self.sort) if self.cursor else ('next', None)
+        if direction == 'next':
+            rows = list(fetch(bound, False, limit))
+            items = rows[:self.per_page]
+            has_next, has_prev = len(rows) > self.per_page, bound is not None
+        else:
+            rows = list(fetch(bound, True, limit))
+            items = rows[:self.per_page][::-1]
+            has_next, has_prev = True, len(rows) > self.per_page
+
+        if items:
+            self.next = encode_cursor('next', items[-1][1], items[-1][0]) if has_next else None
+            self.prev = encode_cursor('prev', items[0][1], items[0][0]) if has_prev else None
+        return items
+
+    def paginate_queryset(self, queryset, plan):
+        """Return the page as dicts serialized by ``plan``."""
+        self._count(queryset)
+        sort = self.sort
+        rows = queryset.values_list('pk', sort.field, *plan.lookups)
+
+        if self.cursor_mode:
+            def fetch(bound, reverse, limit):
+                descending = sort.descending != reverse
+                window = rows if bound is None else rows.filter(sort.after(bound[0], bound[1], descending))
+                return window.order_by(*sort.ordering(descending))[:limit]
+
+            items = self._keyset(fetch)
+        else:
+            page = self._page_number()
+            ordered = rows.order_by(*sort.ordering(sort.descending))
+            items = [] if page < 1 else list(ordered[(page - 1) * self.per_page:page * self.per_page])
+        # Drop the sort value again; plans expect (pk, *lookups).
+        return plan.finish([(row[0],) + row[2:] for row in items])
+
+    def paginate_search(self, backend, keyword, scope):
+        """Page through a ``users.search`` backend; returns user ids."""
+        totals = []
+        if self.cursor_mode:
+            def fetch(bound, reverse, limit):
+                rows, total = backend.search(keyword, scope, 0, limit, sort=self.sort, after=bound, reverse=reverse)
+                totals.append(total)
+                return rows
+
+            rows = self._keyset(fetch)
+        else:
+            page = self._page_number()
+            rows, total = backend.search(keyword, scope, max(0, page - 1) * self.per_page,
+                                         self.per_page if page > 0 else 0, sort=self.sort)
+            totals.append(total)
+
+        if totals[0] is None:
+            self._count(backend.queryset(keyword, scope))
+        elif self.counter.mode != NONE:
+            # In-memory backends know the exact total for free.
+            self.count = totals[0]
+        return [row[0] for row in rows]
+
+    def meta(self):
+        meta = {"is_estimate": self.is_estimate}
+        if self.cursor_mode:
+            meta.update({"next": self.next, "prev": self.prev})
+        return meta
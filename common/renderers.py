@@ -0,0 +1,40 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_fallback_default = JSONEncoder().default
+
+
+def dumps(data):
+    """Encode ``data`` as compact UTF-8 JSON, the way DRF's JSONRenderer would.
+
+    orjson handles datetimes, dates, UUIDs and dicts natively; everything else
+    (querysets, lazy translations, Decimals...) goes through DRF's encoder.
+    """
+    if orjson is not None:
+        try:
+            ret = orjson.dumps(data, default=_fallback_default, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            # Integers beyond 64 bits and other values orjson refuses.
+            pass
+        else:
+            # Same escaping as DRF so the payload stays valid inside JavaScript.
+            if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+                ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+            return ret
+    return JSONRenderer().render(data)
+
+
+class FastJSONRenderer(JSONRenderer):
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        renderer_context = renderer_context or {}
+        if self.ensure_ascii or not self.compact or self.get_indent(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
@@ -1,3 +1,5 @@
+from collections import defaultdict
+
 from rest_framework.permissions import IsAdminUser
 
 
@@ -8,12 +10,14 @@ class IsSuperUser(IsAdminUser):
 
 class IsAgencyAdmin(IsAdminUser):
     def has_permission(self, request, view):
-        return bool(request.user and request.user.is_agency_admin or request.user.is_superuser)
+        return bool(request.user and request.user.is_authenticated and
+                    (request.user.is_agency_admin or request.user.is_superuser))
 
 
 class IsTeamLead(IsAdminUser):
     def has_permission(self, request, view):
-        return bool(request.user and request.user.is_team_lead or request.user.is_agency_admin or request.user.is_superuser)
+        return bool(request.user and request.user.is_authenticated and
+                    (request.user.is_team_lead or request.user.is_agency_admin or request.user.is_superuser))
 
 
 def serialize_user(user):
@@ -26,17 +30,92 @@ def serialize_user(user):
     }
 
 
-def serialize_team(team):
-    return {
-        "team_id": team.id,
-        "team_name": team.name,
-        "team_leader": team.admin.username
-    }
+class Many(object):
+    """Related rows of ``model`` pointing back through ``fk``, loaded for a whole page in one query.
 
+    ``fields`` is a single lookup (giving a flat list) or ``(key, lookup)`` pairs (giving dicts).
+    """
 
-def serialize_agency(agency):
-    return {
-        "agency_id": agency.id,
-        "agency_name": agency.name,
-        "status": agency.is_active
-    }
+    def __init__(self, model, fk, fields):
+        self.model = model
+        self.fk = fk
+        self.fields = fields
+
+    def load(self, owner_ids):
+        grouped = defaultdict(list)
+        related = self.model.objects.filter(**{self.fk + '__in': owner_ids}).order_by('id')
+        if isinstance(self.fields, str):
+            for owner_id, value in related.values_list(self.fk, self.fields):
+                grouped[owner_id].append(value)
+        else:
+            keys = [key for key, lookup in self.fields]
+            for row in related.values_list(self.fk, *(lookup for key, lookup in self.fields)):
+                grouped[row[0]].append(dict(zip(keys, row[1:])))
+        return grouped
+
+
+class FieldPlan(object):
+    """Batch serializer: ``(key, source)`` pairs where source is a lookup (``'admin__username'``) or ``Many``.
+
+    Lookups become a single ``values_list()`` query (joins included), so no model
+    instances are built and related objects are never fetched lazily.
+    """
+
+    def __init__(self, *fields):
+        self.fields = fields
+        self.lookups = [source for key, source in fields if isinstance(source, str)]
+
+    def extend(self, *fields):
+        return FieldPlan(*(self.fields + fields))
+
+    def values_list(self, queryset):
+        # The primary key always comes first so pages can be keyed and Many fields joined.
+        return queryset.values_list('pk', *self.lookups)
+
+    def finish(self, rows):
+        rows = list(rows)
+        loaded = {}
+        for key, source in self.fields:
+            if isinstance(source, Many):
+                loaded[key] = source.load([row[0] for row in rows])
+
+        serialized = []
+        for row in rows:
+            values = iter(row[1:])
+            serialized.append({
+                key: next(values) if isinstance(source, str) else loaded[key].get(row[0], [])
+                for key, source in self.fields
+            })
+        return serialized
+
+    def serialize(self, queryset):
+        return self.finish(self.values_list(queryset))
+
+    def serialize_ids(self, queryset, ids):
+        rows = {row[0]: row for row in self.values_list(queryset.filter(pk__in=ids))}
+        return self.finish(rows[pk] for pk in ids if pk in rows)
+
+    def iterate(self, queryset, chunk_size):
+        """Stream a plan without Many fields over a server-side cursor."""
+        keys = [key for key, source in self.fields]
+        for row in self.values_list(queryset).iterator(chunk_size=chunk_size):
+            yield dict(zip(keys, row[1:]))
+
+
+USER_PLAN = FieldPlan(
+    ('user_id', 'id'),
+    ('username', 'username'),
+    ('first_name', 'first_name'),
+    ('last_name', 'last_name'),
+    ('last_login', 'last_login'),
+)
+TEAM_PLAN = FieldPlan(
+    ('team_id', 'id'),
+    ('team_name', 'name'),
+    ('team_leader', 'admin__username'),
+)
+AGENCY_PLAN = FieldPlan(
+    ('agency_id', 'id'),
+    ('agency_name', 'name'),
+    ('status', 'is_active'),
+)
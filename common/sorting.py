@@ -0,0 +1,73 @@
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q
+from django.utils.translation import ugettext_lazy as _
+from rest_framework import status
+
+from common.exception import CustomException
+
+SORT_ORDERS = ('asc', 'desc')
+
+
+class Sort(object):
+    """Ordering on ``field`` with ``id`` as the tie-breaker.
+
+    NULLs sort last ascending and first descending (PostgreSQL's native placement,
+    so a composite btree index serves both directions), which keeps the rule
+    unchanged when a keyset page walks backwards.
+    """
+
+    def __init__(self, field, descending=False, model=None):
+        self.field = field
+        self.descending = descending
+        self.model_field = model._meta.get_field(field) if model is not None else None
+
+    def ordering(self, descending):
+        pk = '-id' if descending else 'id'
+        if self.field == 'id':
+            return [pk]
+        if descending:
+            return [F(self.field).desc(nulls_first=True), pk]
+        return [F(self.field).asc(nulls_last=True), pk]
+
+    def after(self, value, pk, descending):
+        """Filter for the rows that come after ``(value, pk)`` in this ordering."""
+        field = self.field
+        if field == 'id':
+            return Q(id__lt=pk) if descending else Q(id__gt=pk)
+        if descending:
+            if value is None:
+                return Q(**{field + '__isnull': True, 'id__lt': pk}) | Q(**{field + '__isnull': False})
+            return Q(**{field + '__lt': value}) | Q(**{field: value, 'id__lt': pk})
+        if value is None:
+            return Q(**{field + '__isnull': True, 'id__gt': pk})
+        return Q(**{field + '__gt': value}) | Q(**{field: value, 'id__gt': pk}) | Q(**{field + '__isnull': True})
+
+    def key(self, value, pk):
+        # Python equivalent of the ascending ordering, for sorting in memory.
+        return value is None, value, pk
+
+    def parse(self, value):
+        if self.model_field is None or value is None:
+            return value
+        return self.model_field.to_python(value)
+
+
+ID_DESC = Sort('id', descending=True)
+
+
+def resolve_sort(request, model, whitelist):
+    """Build a Sort from ``?sort_by=`` (a key of ``whitelist``) and ``?sort_order=asc|desc``."""
+    sort_by = request.GET.get('sort_by')
+    sort_order = request.GET.get('sort_order') or 'asc'
+    if not sort_by:
+        return ID_DESC
+    if sort_by not in whitelist or sort_order not in SORT_ORDERS:
+        raise CustomException(code=25, message=_('Invalid sort.'), status_code=status.HTTP_400_BAD_REQUEST)
+    return Sort(whitelist[sort_by], sort_order == 'desc', model)
+
+
+def parse_bound(sort, value, pk):
+    try:
+        return sort.parse(value), int(pk)
+    except (ValidationError, TypeError, ValueError):
+        return None
@@ -0,0 +1,171 @@
+from unittest import mock, skipUnless
+
+from django.core.cache import caches
+from django.db import connection
+from django.db.models.functions import Lower
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework import exceptions
+from rest_framework.authtoken.models import Token
+
+from common.authentication import CachedTokenAuthentication, invalidate_user_credentials, token_cache
+from common.availability import availability, check_batch_size, lower_index_name
+from common.bloom import BloomFilter
+from common.cache import TTLCache
+from common.exception import CustomException
+from common.export import csv_cell
+from common.throttling import SlidingWindowCounter
+from teams.models import Team
+from users.models import User
+
+
+class TTLCacheTests(SimpleTestCase):
+
+    def test_invalidate_tag_drops_only_tagged_entries(self):
+        cache = TTLCache('test', 10, 60)
+        cache.set('a', 1, tags=[('user', 1), ('agency', 7)])
+        cache.set('b', 2, tags=[('user', 2), ('agency', 7)])
+        cache.set('c', 3, tags=[('user', 3)])
+
+        cache.invalidate_tag(('agency', 7))
+
+        self.assertIsNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+        # The other tags of a dropped entry no longer point at it.
+        self.assertNotIn(('user', 1), cache._tags)
+
+    def test_overwrite_replaces_tags(self):
+        cache = TTLCache('test', 10, 60)
+        cache.set('a', 1, tags=[('team', 1)])
+        cache.set('a', 2, tags=[('team', 2)])
+
+        cache.invalidate_tag(('team', 1))
+        self.assertEqual(cache.get('a'), 2)
+        cache.invalidate_tag(('team', 2))
+        self.assertIsNone(cache.get('a'))
+
+    def test_entries_expire(self):
+        cache = TTLCache('test', 10, 60)
+        with mock.patch('common.cache.time.monotonic', return_value=1000):
+            cache.set('a', 1, tags=[('user', 1)])
+        with mock.patch('common.cache.time.monotonic', return_value=1059):
+            self.assertEqual(cache.get('a'), 1)
+        with mock.patch('common.cache.time.monotonic', return_value=1061):
+            self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 0)
+        self.assertNotIn(('user', 1), cache._tags)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = TTLCache('test', 2, 60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_disabled_cache_stores_nothing(self):
+        cache = TTLCache('test', 0, 60)
+        cache.set('a', 1)
+        self.assertIsNone(cache.get('a'))
+
+
+class CachedTokenAuthenticationTests(TestCase):
+
+    def setUp(self):
+        token_cache.clear()
+        self.user = User.objects.create(username='ann', email='ann@example.com', first_name='Ann', last_name='Lee',
+                                        password='!')
+        self.key = Token.objects.create(user=self.user).key
+        self.backend = CachedTokenAuthentication()
+
+    def test_cached_token_costs_no_queries(self):
+        self.backend.authenticate_credentials(self.key)
+        with self.assertNumQueries(0):
+            user, token = self.backend.authenticate_credentials(self.key)
+        self.assertEqual((user.pk, user.email, token.key), (self.user.pk, 'ann@example.com', self.key))
+
+    def test_invalidation_reloads_the_user(self):
+        self.backend.authenticate_credentials(self.key)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        invalidate_user_credentials(self.user.pk)
+
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.backend.authenticate_credentials(self.key)
+
+
+class SlidingWindowCounterTests(SimpleTestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def test_limit_applies_per_identifier(self):
+        counter = SlidingWindowCounter('test', 2, 60)
+        with mock.patch('common.throttling.time.time', return_value=6000):
+            self.assertEqual([counter.hit('a'), counter.hit('a'), counter.hit('a')], [True, True, False])
+            self.assertTrue(counter.hit('b'))
+
+    def test_previous_window_is_weighted_by_overlap(self):
+        counter = SlidingWindowCounter('test', 2, 60)
+        with mock.patch('common.throttling.time.time', return_value=6000):
+            counter.hit('a')
+            counter.hit('a')
+        # Half of the previous window still overlaps: 2 * 0.5 + 0 < 2.
+        with mock.patch('common.throttling.time.time', return_value=6090):
+            self.assertTrue(counter.hit('a'))
+            self.assertFalse(counter.hit('a'))
+
+
+class BloomFilterTests(SimpleTestCase):
+
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(1000)
+        keys = ['user:%d' % i for i in range(1000)]
+        for key in keys:
+            bloom.add(key)
+        self.assertTrue(all(key in bloom for key in keys))
+
+    def test_false_positive_rate_stays_near_target(self):
+        bloom = BloomFilter(1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add('jti:%d' % i)
+        false_positives = sum('jti:other-%d' % i in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+class AvailabilityTests(TestCase):
+
+    def test_values_are_compared_case_insensitively(self):
+        User.objects.create(username='ann', email='Ann@Example.com', password='!')
+        result = availability(User.objects.all(), 'email', ['ann@example.com', 'ANN@EXAMPLE.COM', 'bob@example.com'])
+        self.assertEqual(result, {'ann@example.com': False, 'ANN@EXAMPLE.COM': False, 'bob@example.com': True})
+
+    def test_lookups_have_a_lower_index(self):
+        with connection.cursor() as cursor:
+            self.assertIn(lower_index_name(User, 'email'), connection.introspection.get_constraints(cursor, 'user'))
+            self.assertIn(lower_index_name(Team, 'name'),
+                          connection.introspection.get_constraints(cursor, 'teams_team'))
+
+    @skipUnless(connection.vendor == 'sqlite', 'Plan text is SQLite specific.')
+    def test_lookup_uses_the_lower_index(self):
+        users = User.objects.annotate(normalized=Lower('email')).filter(normalized__in=['ann@example.com'])
+        self.assertIn(lower_index_name(User, 'email'), users.explain())
+
+    @override_settings(AVAILABILITY_CHECK_MAX_VALUES=2)
+    def test_batch_size_is_capped(self):
+        self.assertEqual(check_batch_size(['a', 'b']), ['a', 'b'])
+        with self.assertRaises(CustomException):
+            check_batch_size(['a', 'b', 'c'])
+
+
+class CsvCellTests(SimpleTestCase):
+
+    def test_formula_prefixes_are_quoted(self):
+        for value in ('=SUM(A1:A2)', '+1', '-1', '@cmd', '\tx'):
+            self.assertEqual(csv_cell(value), "'" + value)
+
+    def test_other_values_are_unchanged(self):
+        for value in ('alice@example.com', 'Bob', '', None, 3, True):
+            self.assertEqual(csv_cell(value), value)
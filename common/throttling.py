@@ -0,0 +1,71 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.translation import ugettext_lazy as _
+from rest_framework import status
+from rest_framework.throttling import BaseThrottle
+
+from common import metrics
+from common.exception import CustomException
+
+
+class SlidingWindowCounter(object):
+    """Approximate sliding window: the previous fixed window is weighted by how much of it still overlaps."""
+
+    def __init__(self, prefix, limit, window, cache_alias='default'):
+        self.prefix = prefix
+        self.limit = limit
+        self.window = window
+        self.cache_alias = cache_alias
+
+    def hit(self, identifier):
+        cache = caches[self.cache_alias]
+        now = time.time()
+        index = int(now // self.window)
+        overlap = 1 - (now % self.window) / self.window
+        digest = hashlib.sha1(identifier.encode()).hexdigest()
+        current_key = '%s:%s:%d' % (self.prefix, digest, index)
+        previous_key = '%s:%s:%d' % (self.prefix, digest, index - 1)
+
+        counts = cache.get_many([current_key, previous_key])
+        if counts.get(previous_key, 0) * overlap + counts.get(current_key, 0) >= self.limit:
+            return False
+        if not cache.add(current_key, 1, timeout=self.window * 2):
+            try:
+                cache.incr(current_key)
+            except ValueError:
+                cache.set(current_key, 1, timeout=self.window * 2)
+        return True
+
+
+ip_counter = SlidingWindowCounter('login:ip', *settings.LOGIN_THROTTLE_IP_RATE,
+                                  cache_alias=settings.LOGIN_THROTTLE_CACHE)
+account_counter = SlidingWindowCounter('login:account', *settings.LOGIN_THROTTLE_ACCOUNT_RATE,
+                                       cache_alias=settings.LOGIN_THROTTLE_CACHE)
+
+
+class LoginRateThrottle(BaseThrottle):
+
+    def allow_request(self, request, view):
+        ident = self.get_ident(request)
+        # A list or scalar body is left for the serializer to reject.
+        data = request.data if isinstance(request.data, dict) else {}
+        account = data.get('username') or data.get('email')
+        with metrics.timer('login.throttle'):
+            if not ip_counter.hit(ident):
+                metrics.incr('login.throttled.ip')
+                return False
+            if account and not account_counter.hit(str(account).strip().lower()):
+                metrics.incr('login.throttled.account')
+                return False
+        return True
+
+
+class LoginThrottleMixin(object):
+    throttle_classes = (LoginRateThrottle,)
+
+    def throttled(self, request, wait):
+        raise CustomException(code=21, message=_('Too many login attempts, please retry later.'),
+                              status_code=status.HTTP_429_TOO_MANY_REQUESTS)
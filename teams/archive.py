@@ -0,0 +1,158 @@
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.translation import ugettext_lazy as _
+from rest_framework import status
+
+from common import jobs as job_queue
+from common.authentication import invalidate_agency_credentials, invalidate_user_credentials
+from common.exception import CustomException
+from common.jobs import JobCancelled
+from teams.models import ArchiveJob, Team
+from users.member_counts import shift_active_members
+from users.models import User
+from users.revocation import revocation_list
+from users.search import user_search
+
+logger = logging.getLogger(__name__)
+
+
+def archive_batch(scope, scope_id, is_active, after_id, batch_size, checkpoint=None):
+    """Move the next ``batch_size`` members of the scope after ``after_id`` to ``is_active``.
+
+    Runs in one short transaction that locks only the batch. Returns ``(last_id,
+    processed, changed_ids)``, with ``last_id`` None once the scope is exhausted.
+    ``checkpoint(last_id, processed, changed)`` runs inside the transaction and may
+    raise JobCancelled to roll the batch back.
+    """
+    members = User.objects.filter(**{scope: scope_id}, id__gt=after_id)
+    if scope == 'agency' and is_active:
+        # Members of teams that are still archived stay archived.
+        members = members.exclude(team__is_active=False)
+    with transaction.atomic():
+        # The team join is an outer join, whose nullable side PostgreSQL refuses to lock.
+        rows = list(
+            members.select_for_update(of=('self',)).order_by('id')
+            .values_list('id', 'team_id', 'agency_id', 'is_active')[:batch_size]
+        )
+        if not rows:
+            return None, 0, []
+        changed = [row for row in rows if row[3] != is_active]
+        if changed:
+            User.objects.filter(id__in=[row[0] for row in changed]).update(is_active=is_active)
+            # Queryset updates skip the signals that maintain the counters.
+            shift_active_members([(team_id, agency_id) for _, team_id, agency_id, _ in changed],
+                                 1 if is_active else -1)
+        last_id = rows[-1][0]
+        if checkpoint is not None:
+            checkpoint(last_id, len(rows), len(changed))
+
+    changed_ids = [row[0] for row in changed]
+    invalidate_user_credentials(*changed_ids)
+    user_search.refresh(*changed_ids)
+    return last_id, len(rows), changed_ids
+
+
+def cascade(scope, scope_id, is_active, after_id=0, batch_size=None, checkpoint=None):
+    batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+    while after_id is not None:
+        after_id = archive_batch(scope, scope_id, is_active, after_id, batch_size, checkpoint)[0]
+
+
+def set_active(scope, instance, is_active, user=None):
+    """Archive or unarchive ``instance`` (an Agency or Team) and cascade to its members.
+
+    Scopes with up to ARCHIVE_SYNC_LIMIT members cascade right away; larger ones are
+    queued as an ArchiveJob for ``manage.py run_archive_jobs``, which is returned.
+    Tokens are revoked up front, so archived members are locked out either way.
+    A team cannot be unarchived while its agency is archived, and unarchiving an
+    agency leaves the members of its archived teams archived.
+    """
+    if scope == 'team' and is_active and instance.agency_id is not None and not instance.agency.is_active:
+        raise CustomException(code=27, message=_('Unarchive the agency first.'),
+                              status_code=status.HTTP_409_CONFLICT)
+
+    # Whatever cascade is still pending for the scope is superseded by this one.
+    superseded = Q(scope=scope, scope_id=instance.pk)
+    if scope == 'agency' and not is_active:
+        # So are team unarchives that would reactivate members of the archived agency.
+        superseded |= Q(scope='team', is_active=True,
+                        scope_id__in=Team.objects.filter(agency_id=instance.pk).values('id'))
+    ArchiveJob.objects.filter(superseded, status__in=(ArchiveJob.QUEUED, ArchiveJob.RUNNING)).update(
+        status=ArchiveJob.CANCELLED, message='Superseded.', finished_at=timezone.now()
+    )
+
+    instance.is_active = is_active
+    instance.save()
+    if not is_active:
+        if scope == 'agency':
+            revocation_list.revoke_agency(instance.pk)
+        else:
+            revocation_list.revoke_team(instance.pk)
+    if scope == 'agency':
+        invalidate_agency_credentials(instance.pk)
+
+    if instance.member_count <= settings.ARCHIVE_SYNC_LIMIT:
+        cascade(scope, instance.pk, is_active)
+        return None
+    return ArchiveJob.objects.create(
+        scope=scope, scope_id=instance.pk, is_active=is_active, total_users=instance.member_count, created_by=user
+    )
+
+
+def claim_job(worker):
+    return job_queue.claim_job(ArchiveJob.objects.all(), worker, settings.ARCHIVE_STALE_AFTER)
+
+
+def run_job(job, batch_size=None):
+    """Cascade the job's scope, resuming after ``last_user_id``; progress commits with each batch."""
+    jobs = ArchiveJob.objects.filter(pk=job.pk, status=ArchiveJob.RUNNING, worker=job.worker)
+
+    def checkpoint(last_id, processed, changed):
+        if not jobs.update(
+            last_user_id=last_id,
+            processed_users=F('processed_users') + processed,
+            changed_users=F('changed_users') + changed,
+            heartbeat_at=timezone.now()
+        ):
+            raise JobCancelled
+
+    cascade(job.scope, job.scope_id, job.is_active, job.last_user_id, batch_size, checkpoint)
+    jobs.update(status=ArchiveJob.DONE, finished_at=timezone.now())
+
+
+def process_next_job(worker, batch_size=None):
+    """Claim and run one job; return it, or None when the queue is empty."""
+    job = claim_job(worker)
+    if job is None:
+        return None
+    try:
+        run_job(job, batch_size)
+    except JobCancelled:
+        logger.info('Archive job %d was cancelled.', job.pk)
+    except Exception as exc:
+        logger.exception('Archive job %d failed.', job.pk)
+        ArchiveJob.objects.filter(pk=job.pk, status=ArchiveJob.RUNNING, worker=worker).update(
+            status=ArchiveJob.FAILED, message=str(exc), finished_at=timezone.now()
+        )
+    return job
+
+
+def serialize_job(job):
+    return {
+        "job_id": job.id,
+        "scope": job.scope,
+        "scope_id": job.scope_id,
+        "is_active": job.is_active,
+        "status": job.status,
+        "total_users": job.total_users,
+        "processed_users": job.processed_users,
+        "changed_users": job.changed_users,
+        "message": job.message,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
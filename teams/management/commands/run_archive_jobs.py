@@ -0,0 +1,32 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from common.jobs import worker_name
+from teams.archive import process_next_job
+
+
+class Command(BaseCommand):
+    help = 'Work through queued agency/team archive cascades, using the database as the queue.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.ARCHIVE_BATCH_SIZE)
+        parser.add_argument('--poll-interval', type=int, default=settings.ARCHIVE_POLL_INTERVAL,
+                            help='Seconds to wait when the queue is empty.')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty.')
+
+    def handle(self, *args, **options):
+        worker = worker_name()
+        while True:
+            job = process_next_job(worker, options['batch_size'])
+            if job is not None:
+                job.refresh_from_db()
+                self.stdout.write('Archive job %d: %s %s %d, %s, %d/%s users, %d changed.' % (
+                    job.pk, 'unarchive' if job.is_active else 'archive', job.scope, job.scope_id, job.status,
+                    job.processed_users, job.total_users, job.changed_users
+                ))
+                continue
+            if options['once']:
+                break
+            time.sleep(options['poll_interval'])
@@ -3,7 +3,31 @@ from django.db import models
 from common.models import BaseModel, CommonParameters
 
 
-class Agency(BaseModel):
+class MemberCountedModel(BaseModel):
+    # Maintained with F() updates by users.member_counts; save() never writes counter_fields back.
+    member_count = models.IntegerField(default=0)
+    active_member_count = models.IntegerField(default=0)
+    counter_fields = ('member_count', 'active_member_count')
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.counter_fields and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
+
+
+class Agency(MemberCountedModel):
+    class Meta:
+        indexes = [
+            models.Index(fields=[column, 'id'], name='agency_%s_idx' % column)
+            for column in ('name', 'created_at', 'is_active')
+        ]
 
     name = models.CharField(max_length=100, default=False)
     amadeus_branded_fares = models.BooleanField(default=False)
@@ -16,6 +40,8 @@ class Agency(BaseModel):
     common_parameters = models.OneToOneField(CommonParameters, on_delete=models.CASCADE,
                                              related_name='agency_common_parameters', null=True)
     admin = models.ForeignKey('users.User', on_delete=models.CASCADE, related_name='agency_user', null=True)
+    claims_version = models.PositiveIntegerField(default=1)
+    counter_fields = MemberCountedModel.counter_fields + ('claims_version',)
 
     def __str__(self):
         return self.name
@@ -34,7 +60,14 @@ class DataSource(BaseModel):
     queue = models.CharField(max_length=40, default="01")
 
 
-class Team(BaseModel):
+class Team(MemberCountedModel):
+    class Meta:
+        indexes = [
+            models.Index(fields=['agency', column, 'id'], name='team_agency_%s_idx' % column)
+            for column in ('name', 'created_at', 'is_active')
+        ] + [
+            models.Index(fields=[column, 'id'], name='team_%s_idx' % column) for column in ('name', 'created_at')
+        ]
 
     name = models.CharField(max_length=100)
     is_active = models.BooleanField(default=True)
@@ -46,3 +79,30 @@ class Team(BaseModel):
 
     def __str__(self):
         return self.name
+
+
+class ArchiveJob(models.Model):
+    class Meta:
+        db_table = 'archive_job'
+        indexes = [models.Index(fields=['status', 'id'], name='archive_job_status_idx')]
+
+    QUEUED, RUNNING, DONE, FAILED, CANCELLED = 'queued', 'running', 'done', 'failed', 'cancelled'
+    STATUS_CHOICES = [(QUEUED, QUEUED), (RUNNING, RUNNING), (DONE, DONE), (FAILED, FAILED), (CANCELLED, CANCELLED)]
+    SCOPE_CHOICES = [("agency", "agency"), ("team", "team")]
+    scope = models.CharField(max_length=6, choices=SCOPE_CHOICES)
+    scope_id = models.IntegerField()
+    # State the members are moved to: False archives, True unarchives.
+    is_active = models.BooleanField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    total_users = models.IntegerField(null=True)
+    processed_users = models.IntegerField(default=0)
+    changed_users = models.IntegerField(default=0)
+    # Keyset position; a reclaimed job resumes after it.
+    last_user_id = models.IntegerField(default=0)
+    created_by = models.ForeignKey('users.User', on_delete=models.SET_NULL, related_name='archive_jobs', null=True)
+    message = models.TextField(blank=True, default='')
+    worker = models.CharField(max_length=100, blank=True, default='')
+    heartbeat_at = models.DateTimeField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True)
+    finished_at = models.DateTimeField(null=True)
@@ -2,6 +2,7 @@ from django.utils.translation import ugettext_lazy as _
 from django.core.exceptions import ObjectDoesNotExist
 from rest_framework import serializers
 
+from common.availability import check_batch_size
 from common.exception import CustomException
 from teams.models import Team, Agency, DataSource
 from users.models import User
@@ -189,4 +190,11 @@ class AgencyUpdateSerializer(serializers.ModelSerializer):
             attrs['agency'] = agency
             return attrs
         except ObjectDoesNotExist:
-            raise CustomException(code=14, message=self.error_messages['invalid_data_source_id'])
\ No newline at end of file
+            raise CustomException(code=14, message=self.error_messages['invalid_data_source_id'])
+
+
+class TeamNameBatchCheckSerializer(serializers.Serializer):
+    team_names = serializers.ListField(child=serializers.CharField(allow_blank=True))
+
+    def validate_team_names(self, value):
+        return check_batch_size(value)
@@ -0,0 +1,179 @@
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from common.exception import CustomException
+from common.jobs import JobCancelled
+from teams import archive
+from teams.archive import process_next_job, set_active
+from teams.models import Agency, ArchiveJob, Team
+from users.models import RevokedToken, User
+
+
+def make_user(username, **fields):
+    return User.objects.create(username=username, email='%s@example.com' % username, first_name=username,
+                               last_name=username, password='!', **fields)
+
+
+class ArchiveCascadeTests(TestCase):
+
+    def setUp(self):
+        self.agency = Agency.objects.create(name='Acme')
+        self.blue = Team.objects.create(name='Blue', agency=self.agency)
+        self.red = Team.objects.create(name='Red', agency=self.agency)
+        for index in range(5):
+            make_user('blue%d' % index, agency=self.agency, team=self.blue)
+        make_user('red0', agency=self.agency, team=self.red)
+        make_user('loner', agency=self.agency)
+        self.agency.refresh_from_db()
+        self.blue.refresh_from_db()
+
+    def active(self, **filters):
+        return User.objects.filter(is_active=True, **filters).count()
+
+    def counts(self, group):
+        group.refresh_from_db()
+        return group.member_count, group.active_member_count
+
+    @override_settings(ARCHIVE_BATCH_SIZE=2)
+    def test_small_scope_cascades_inline(self):
+        self.assertIsNone(set_active('agency', self.agency, False))
+
+        self.assertEqual(self.active(agency=self.agency), 0)
+        self.assertEqual(self.counts(self.agency), (7, 0))
+        self.assertEqual(self.counts(self.blue), (5, 0))
+        self.assertTrue(RevokedToken.objects.filter(key='agency:%d' % self.agency.id).exists())
+
+        set_active('agency', self.agency, True)
+        self.assertEqual(self.active(agency=self.agency), 7)
+        self.assertEqual(self.counts(self.agency), (7, 7))
+
+    def test_team_cascade_leaves_other_members_alone(self):
+        set_active('team', self.blue, False)
+
+        self.assertEqual(self.active(team=self.blue), 0)
+        self.assertEqual(self.active(agency=self.agency), 2)
+        self.assertEqual(self.counts(self.agency), (7, 2))
+        self.assertTrue(RevokedToken.objects.filter(key='team:%d' % self.blue.id).exists())
+
+    def test_team_of_archived_agency_cannot_be_unarchived(self):
+        set_active('team', self.blue, False)
+        self.agency.refresh_from_db()
+        set_active('agency', self.agency, False)
+        self.blue.refresh_from_db()
+
+        with self.assertRaises(CustomException) as raised:
+            set_active('team', self.blue, True)
+        self.assertEqual(raised.exception.detail['errorCode'], 27)
+        self.blue.refresh_from_db()
+        self.assertFalse(self.blue.is_active)
+        self.assertEqual(self.active(team=self.blue), 0)
+
+    def test_agency_unarchive_skips_members_of_archived_teams(self):
+        set_active('team', self.blue, False)
+        self.agency.refresh_from_db()
+        set_active('agency', self.agency, False)
+        self.agency.refresh_from_db()
+        set_active('agency', self.agency, True)
+
+        self.assertEqual(self.active(team=self.blue), 0)
+        self.assertEqual(self.active(agency=self.agency), 2)
+        self.assertEqual(self.counts(self.agency), (7, 2))
+        self.assertEqual(self.counts(self.blue), (5, 0))
+
+    @override_settings(ARCHIVE_SYNC_LIMIT=1)
+    def test_large_scope_is_queued_and_run_in_batches(self):
+        job = set_active('agency', self.agency, False)
+
+        self.assertEqual((job.status, job.total_users), (ArchiveJob.QUEUED, 7))
+        self.assertEqual(self.active(agency=self.agency), 7)
+        self.assertEqual(process_next_job('w1', batch_size=3).pk, job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ArchiveJob.DONE)
+        self.assertEqual((job.processed_users, job.changed_users), (7, 7))
+        self.assertEqual(self.active(agency=self.agency), 0)
+        self.assertEqual(self.counts(self.agency), (7, 0))
+        self.assertIsNone(process_next_job('w1'))
+
+    @override_settings(ARCHIVE_SYNC_LIMIT=1)
+    def test_crashed_job_resumes_after_its_last_committed_batch(self):
+        job = set_active('agency', self.agency, False)
+        archive_batch = archive.archive_batch
+        calls = []
+
+        def crash_on_second_batch(*args, **kwargs):
+            calls.append(args)
+            if len(calls) == 2:
+                raise RuntimeError('worker died')
+            return archive_batch(*args, **kwargs)
+
+        job = archive.claim_job('w1')
+        with mock.patch('teams.archive.archive_batch', crash_on_second_batch):
+            with self.assertRaises(RuntimeError):
+                archive.run_job(job, batch_size=3)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed_users), (ArchiveJob.RUNNING, 3))
+        self.assertEqual(self.active(agency=self.agency), 4)
+
+        with override_settings(ARCHIVE_STALE_AFTER=-1):
+            process_next_job('w2', batch_size=3)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker, job.processed_users), (ArchiveJob.DONE, 'w2', 7))
+        self.assertEqual(self.counts(self.agency), (7, 0))
+
+    @override_settings(ARCHIVE_SYNC_LIMIT=1)
+    def test_new_request_supersedes_pending_job(self):
+        archiving = set_active('agency', self.agency, False)
+        set_active('agency', self.agency, True)
+
+        archiving.refresh_from_db()
+        self.assertEqual((archiving.status, archiving.message), (ArchiveJob.CANCELLED, 'Superseded.'))
+
+    def test_archiving_agency_supersedes_team_unarchive(self):
+        set_active('team', self.blue, False)
+        self.blue.refresh_from_db()
+        with override_settings(ARCHIVE_SYNC_LIMIT=1):
+            unarchiving = set_active('team', self.blue, True)
+            self.agency.refresh_from_db()
+            set_active('agency', self.agency, False)
+
+        unarchiving.refresh_from_db()
+        self.assertEqual(unarchiving.status, ArchiveJob.CANCELLED)
+
+    def test_cancelled_batch_rolls_back(self):
+        ArchiveJob.objects.create(scope='team', scope_id=self.blue.id, is_active=False)
+        job = archive.claim_job('w1')
+        ArchiveJob.objects.filter(pk=job.pk).update(status=ArchiveJob.CANCELLED)
+
+        with self.assertRaises(JobCancelled):
+            archive.run_job(job)
+        self.assertEqual(self.active(team=self.blue), 5)
+        self.assertEqual(self.counts(self.blue), (5, 5))
+
+
+class TeamArchiveViewTests(TestCase):
+
+    def setUp(self):
+        self.agency = Agency.objects.create(name='Acme')
+        self.other = Agency.objects.create(name='Other')
+        self.blue = Team.objects.create(name='Blue', agency=self.agency)
+        make_user('blue0', agency=self.agency, team=self.blue)
+        self.client = APIClient()
+
+    def archive(self, user):
+        self.client.force_authenticate(user)
+        response = self.client.get('/api/v1/teams/%d/archive/' % self.blue.id)
+        self.blue.refresh_from_db()
+        return response.json()['result']
+
+    def test_admins_of_other_agencies_cannot_archive_the_team(self):
+        self.assertFalse(self.archive(make_user('intruder', agency=self.other, is_agency_admin=True)))
+        self.assertTrue(self.blue.is_active)
+
+        self.assertTrue(self.archive(make_user('admin', agency=self.agency, is_agency_admin=True)))
+        self.assertFalse(self.blue.is_active)
+
+    def test_superusers_can_archive_any_team(self):
+        self.assertTrue(self.archive(make_user('root', is_superuser=True)))
+        self.assertFalse(self.blue.is_active)
@@ -2,13 +2,16 @@ from django.urls import path
 
 from .views import NameCheckView, AllTeamsView, TeamDetailView, AddTeamView, AllAgencyView, AddAgencyView, AllTeamsListView, \
     AgencyListView, TeamUpdateView, AgencyDetailView, AgencyUpdateView, DataSourceView, TeamAchieveView, \
-    AvailableDataSourceView, AgencyAchieveView, AgencyTeamsListView
+    AvailableDataSourceView, AgencyAchieveView, AgencyTeamsListView, TeamExportView, AgencyExportView, \
+    NameBatchCheckView, ArchiveJobView
 
 app_name = 'teams'
 
 urlpatterns = [
     path('name-check/', NameCheckView.as_view()),
+    path('name-check/batch/', NameBatchCheckView.as_view()),
     path('search/', AllTeamsView.as_view()),
+    path('export/', TeamExportView.as_view()),
     path('list/', AllTeamsListView.as_view()),
     path('list/<int:pk>/', AgencyTeamsListView.as_view()),
     path('add/', AddTeamView.as_view()),
@@ -17,11 +20,13 @@ urlpatterns = [
     path('<int:pk>/archive/', TeamAchieveView.as_view()),
 
     path('agency/search/', AllAgencyView.as_view()),
+    path('agency/export/', AgencyExportView.as_view()),
     path('agency/list/', AgencyListView.as_view()),
     path('agency/add/', AddAgencyView.as_view()),
     path('agency/<int:pk>/', AgencyDetailView.as_view()),
     path('agency/update/', AgencyUpdateView.as_view()),
     path('agency/<int:pk>/archive/', AgencyAchieveView.as_view()),
+    path('archive/<int:pk>/', ArchiveJobView.as_view()),
 
     path('data_source/', DataSourceView.as_view()),
     path('data_source/<int:pk>/', AvailableDataSourceView.as_view())
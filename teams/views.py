@@ -1,16 +1,51 @@
 from django.core.exceptions import ObjectDoesNotExist
-from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
 from rest_framework import status
 from rest_framework.generics import GenericAPIView
 from rest_framework.response import Response
-from django.db.models import Q
-
-from common.serializers import IsSuperUser, IsAgencyAdmin, IsTeamLead, serialize_team, serialize_agency
+from django.db.models import F, Q
+
+from common.availability import availability
+from common.counting import EXACT
+from common.export import export_response
+from common.pagination import Pagination
+from common.sorting import resolve_sort
+from common.serializers import IsSuperUser, IsAgencyAdmin, IsTeamLead, FieldPlan, Many, TEAM_PLAN, AGENCY_PLAN
 from common.models import CommonParameters
-from teams.models import Team, Agency, DataSource
+from api.claims import bump_claims_version
+from teams.archive import serialize_job, set_active
+from teams.models import ArchiveJob, Team, Agency, DataSource
+from users.member_counts import recounting
 from users.models import User
+from users.search import user_search
 from .serializers import TeamCreateSerializer, AgencySerializer, TeamSerializer, TeamUpdateSerializer, \
-    AgencyAddSerializer, AgencyUpdateSerializer
+    AgencyAddSerializer, AgencyUpdateSerializer, TeamNameBatchCheckSerializer
+
+DATA_SOURCE_PLAN = FieldPlan(
+    ('id', 'id'),
+    ('pcc', 'pcc'),
+    ('provider', 'provider'),
+)
+SEARCH_TEAM_PLAN = TEAM_PLAN.extend(
+    ('leader_id', 'admin_id'),
+    ('is_booking', 'is_booking'),
+    ('agency_name', 'agency__name'),
+    ('members', Many(User, 'team', 'id')),
+    ('number_of_users', 'member_count'),
+)
+SEARCH_AGENCY_PLAN = AGENCY_PLAN.extend(
+    ('number_of_users', 'member_count'),
+    ('admin_id', 'admin_id'),
+    ('api_username', 'api_username'),
+    ('api_password', 'api_password'),
+    ('data_source', Many(DataSource, 'agency', DATA_SOURCE_PLAN.fields)),
+)
+TEAM_EXPORT_FIELDS = (
+    'id', 'name', 'agency_id', 'agency_name', 'admin_id', 'admin_email', 'is_active', 'is_booking', 'created_at'
+)
+AGENCY_EXPORT_FIELDS = (
+    'id', 'name', 'admin_id', 'admin_email', 'is_active', 'is_iframe', 'student_and_youth', 'amadeus_branded_fares',
+    'style_group', 'created_at'
+)
 
 
 class NameCheckView(GenericAPIView):
@@ -31,93 +66,80 @@ class NameCheckView(GenericAPIView):
         return Response({"result": True})
 
 
+class NameBatchCheckView(GenericAPIView):
+    permission_classes = IsTeamLead,
+    serializer_class = TeamNameBatchCheckSerializer
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(
+            {
+                "result": True,
+                "data": {
+                    "available": availability(Team.objects.all(), 'name', serializer.validated_data['team_names'])
+                }
+            }
+        )
+
+
 class AllTeamsView(GenericAPIView):
     permission_classes = IsTeamLead,
+    count_mode = EXACT
+    sort_fields = {'name': 'name', 'created_at': 'created_at', 'is_active': 'is_active'}
 
     def get(self, request):
         keyword = request.GET.get('keyword')
-        page = request.GET.get('page')
-        number_per_page = request.GET.get('per_page')
-        sea_teams = []
 
-        if request.user.is_superuser:
-            if keyword:
-                allteams = Team.objects.filter(name__icontains=keyword).order_by('-id')
-                number_of_team = Team.objects.filter(name__icontains=keyword).count()
-            else:
-                allteams = Team.objects.all().order_by('-id')
-                number_of_team = Team.objects.all().count()
-            paginator = Paginator(allteams, number_per_page)
-            try:
-                search = paginator.page(page)
-            except PageNotAnInteger:
-                search = paginator.page(1)
-            except EmptyPage:
-                search = []
-
-        elif request.user.is_agency_admin:
-            agency = request.user.agency
+        if request.user.is_superuser or request.user.is_agency_admin:
+            allteams = Team.objects.all()
+            if not request.user.is_superuser:
+                allteams = allteams.filter(agency=request.user.agency)
             if keyword:
-                allteams = Team.objects.filter(agency=agency, name__icontains=keyword).order_by('-id')
-                number_of_team = Team.objects.filter(agency=agency, name__icontains=keyword).count()
-            else:
-                allteams = Team.objects.filter(agency=agency).order_by('-id')
-                number_of_team = Team.objects.filter(agency=agency).count()
-            paginator = Paginator(allteams, number_per_page)
-            try:
-                search = paginator.page(page)
-            except PageNotAnInteger:
-                search = paginator.page(1)
-            except EmptyPage:
-                search = []
+                allteams = allteams.filter(name__icontains=keyword)
+            pagination = Pagination(request, self.count_mode, resolve_sort(request, Team, self.sort_fields))
+            sea_teams = pagination.paginate_queryset(allteams, SEARCH_TEAM_PLAN)
+            number_of_team = pagination.count
         else:
-            number_of_team = 1
-            team = request.user.team
-            number_of_users = User.objects.filter(team=team).count()
-            members = User.objects.filter(team=team).values_list("id", flat=True)
-            item = []
-            item.append({
-                **serialize_team(team),
-                "agency_name": team.agency.name,
-                "leader_id": team.admin.id,
-                "is_booking": team.is_booking,
-                "members": members,
-                "number_of_users": number_of_users
-            })
             return Response(
                 {
                     "result": True,
                     "data": {
-                        "number_of_teams": number_of_team,
-                        "teams": item
+                        "number_of_teams": 1,
+                        "teams": SEARCH_TEAM_PLAN.serialize(Team.objects.filter(id=request.user.team_id))
                     }
                 },
                 status=status.HTTP_201_CREATED
             )
 
-        for sea in search:
-            number_of_users = User.objects.filter(team=sea).count()
-            members = User.objects.filter(team=sea).values_list("id", flat=True)
-            sea_teams.append({
-                **serialize_team(sea),
-                "leader_id": sea.admin.id,
-                "is_booking": sea.is_booking,
-                "agency_name": sea.agency.name,
-                "members": members,
-                "number_of_users": number_of_users
-            })
         return Response(
             {
                 "result": True,
                 "data": {
                     "number_of_teams": number_of_team,
-                    "teams": sea_teams
+                    "teams": sea_teams,
+                    **pagination.meta()
                 }
             },
             status=status.HTTP_201_CREATED
         )
 
 
+class TeamExportView(GenericAPIView):
+    permission_classes = IsTeamLead,
+
+    def get(self, request):
+        teams = Team.objects.all()
+        if request.user.is_superuser:
+            pass
+        elif request.user.is_agency_admin:
+            teams = teams.filter(agency_id=request.user.agency_id)
+        else:
+            teams = teams.filter(id=request.user.team_id)
+        teams = teams.annotate(agency_name=F('agency__name'), admin_email=F('admin__email'))
+        return export_response(request, teams, TEAM_EXPORT_FIELDS, 'teams')
+
+
 class AllTeamsListView(GenericAPIView):
     permission_classes = IsAgencyAdmin,
 
@@ -127,16 +149,11 @@ class AllTeamsListView(GenericAPIView):
         else:
             agency = Agency.objects.get(admin=request.user)
             team_list = Team.objects.filter(agency=agency)
-        team_detail = []
-        for team in team_list:
-            team_detail.append({
-                **serialize_team(team)
-            })
         return Response(
             {
                 "result": True,
                 "data": {
-                    "teams": team_detail
+                    "teams": TEAM_PLAN.serialize(team_list)
                 }
             },
             status=status.HTTP_201_CREATED
@@ -219,14 +236,19 @@ class TeamUpdateView(GenericAPIView):
         team.save()
         members = serializer.data.get('members')
         if members:
-            User.objects.filter(team=team).update(team=None, is_agent=True)
-            User.objects.filter(id__in=members).update(team=team, is_agent=True)
+            moved = list(User.objects.filter(Q(team=team) | Q(id__in=members)).values_list('id', flat=True))
+            with recounting(User.objects.filter(id__in=moved), team_ids=[team.id]):
+                User.objects.filter(team=team).update(team=None, is_agent=True)
+                User.objects.filter(id__in=members).update(team=team, is_agent=True)
+            # Queryset updates send no signals, so the search index is told directly.
+            user_search.refresh(*moved)
         if serializer.data.get('admin_id'):
             user = User.objects.get(id=serializer.data.get('admin_id'))
             user.is_team_lead = True
             user.is_agent = False
             user.team = team
             user.save()
+        bump_claims_version(team.agency_id)
         number_of_users = User.objects.filter(id__in=members).count()
 
         return Response(
@@ -258,55 +280,45 @@ class AddTeamView(GenericAPIView):
         user = request.user
         if request.user.is_agency_admin:
             agency = user.agency
-            common_parameter = agency.common_parameters
 
             team = Team()
             team.name = serializer.data.get('team_name')
             if serializer.data.get('admin_id'):
                 team.admin = User.objects.get(id=serializer.data.get('admin_id'))
             team.is_booking = serializer.data.get('is_booking')
-
-            common_parameters = CommonParameters()
-            common_parameters.currency = common_parameter.currency
-            common_parameters.date_type = common_parameter.date_type
-            common_parameters.booking_enabled = common_parameter.booking_enabled
-            common_parameters.virtual_interlining = common_parameter.virtual_interlining
-            common_parameters.exclude_carriers = common_parameter.exclude_carriers
-            common_parameters.save()
-            team.common_parameters = common_parameters
             team.save()
             members = serializer.data.get('members')
             if members:
-                User.objects.filter(id__in=members).update(team=team, agency=agency, is_agent=True)
+                with recounting(User.objects.filter(id__in=members), team_ids=[team.id], agency_ids=[agency.id]):
+                    User.objects.filter(id__in=members).update(team=team, agency=agency, is_agent=True)
+                user_search.refresh(*members)
             if serializer.data.get('admin_id'):
                 user = User.objects.get(id=serializer.data.get('admin_id'))
                 user.is_team_lead = True
                 user.is_agent = False
                 user.save()
+            bump_claims_version(agency.id)
         else:
             team = Team()
             team.name = serializer.data.get('team_name')
             if serializer.data.get('admin_id'):
                 team.admin = User.objects.get(id=serializer.data.get('admin_id'))
             team.is_booking = serializer.data.get('is_booking')
-
-            common_parameters = CommonParameters()
-            common_parameters.currency = 'USD'
-            common_parameters.date_type = 'mm/dd/yyyy'
-            common_parameters.booking_enabled = True
-            common_parameters.virtual_interlining = True
-            common_parameters.exclude_carriers = 1
-            common_parameters.save()
-            team.common_parameters = common_parameters
             team.save()
             members = serializer.data.get('members')
             if members:
-                User.objects.filter(id__in=members).update(team=team, is_agent=False)
+                with recounting(User.objects.filter(id__in=members), team_ids=[team.id]):
+                    User.objects.filter(id__in=members).update(team=team, is_agent=False)
+                user_search.refresh(*members)
             if serializer.data.get('admin_id'):
                 user = User.objects.get(id=serializer.data.get('admin_id'))
                 user.is_team_lead = True
                 user.is_agent = False
                 user.save()
+            if members or serializer.data.get('admin_id'):
+                bump_claims_version(*User.objects.filter(
+                    Q(id__in=members or []) | Q(id=serializer.data.get('admin_id'))
+                ).values_list('agency_id', flat=True).distinct())
 
         return Response(
             {
@@ -321,110 +333,64 @@ class AddTeamView(GenericAPIView):
 
 class AllAgencyView(GenericAPIView):
     permission_classes = IsAgencyAdmin,
+    count_mode = EXACT
+    sort_fields = {'name': 'name', 'created_at': 'created_at', 'is_active': 'is_active'}
 
     def get(self, request):
         keyword = request.GET.get('keyword')
-        page = request.GET.get('page')
-        number_per_page = request.GET.get('per_page')
-        sea_agency = []
         if request.user.is_superuser:
+            allagencies = Agency.objects.all()
             if keyword:
-                allagencies = Agency.objects.filter(name__icontains=keyword).order_by('-id')
-                number_of_agency = Agency.objects.filter(name__icontains=keyword).count()
-            else:
-                allagencies = Agency.objects.all().order_by('-id')
-                number_of_agency = Agency.objects.all().count()
-            paginator = Paginator(allagencies, number_per_page)
-            try:
-                search = paginator.page(page)
-            except PageNotAnInteger:
-                search = paginator.page(1)
-            except EmptyPage:
-                search = []
+                allagencies = allagencies.filter(name__icontains=keyword)
+            pagination = Pagination(request, self.count_mode, resolve_sort(request, Agency, self.sort_fields))
+            sea_agency = pagination.paginate_queryset(allagencies, SEARCH_AGENCY_PLAN)
+            number_of_agency = pagination.count
 
         else:
-            agency = request.user.agency
-            teams = Team.objects.filter(agency=agency)
-            number_of_users = 0
-            data_source = DataSource.objects.filter(agency=agency)
-            data = []
-            for item in data_source:
-                data.append({
-                    "id": item.id,
-                    "pcc": item.pcc,
-                    "provider": item.provider
-                })
-            for team in teams:
-                number_of_users = number_of_users + User.objects.filter(team=team).count()
-            sea_agency.append({
-                **serialize_agency(agency),
-                "number_of_users": number_of_users,
-                "admin_id": agency.admin.id,
-                "api_username": agency.api_username,
-                "api_password": agency.api_password,
-                "data_source": data
-            })
-
             return Response(
                 {
                     "result": True,
                     "data": {
                         "superuser_name": request.user.username,
                         "number_of_agencies": 1,
-                        "agency": sea_agency
+                        "agency": SEARCH_AGENCY_PLAN.serialize(Agency.objects.filter(id=request.user.agency_id))
                     }
                 }
             )
 
-        for sea in search:
-            teams = Team.objects.filter(agency=sea)
-            number_of_users = 0
-            data_source = DataSource.objects.filter(agency=sea)
-            data = []
-            for item in data_source:
-                data.append({
-                    "id": item.id,
-                    "pcc": item.pcc,
-                    "provider": item.provider
-                })
-            for team in teams:
-                number_of_users = number_of_users + User.objects.filter(team=team).count()
-            sea_agency.append({
-                **serialize_agency(sea),
-                "number_of_users": number_of_users,
-                "admin_id": sea.admin_id,
-                "api_username": sea.api_username,
-                "api_password": sea.api_password,
-                "data_source": data
-            })
-
         return Response(
             {
                 "result": True,
                 "data": {
                     "superuser_name": request.user.username,
                     "number_of_agencies": number_of_agency,
-                    "agency": sea_agency
+                    "agency": sea_agency,
+                    **pagination.meta()
                 }
             }
         )
 
 
+class AgencyExportView(GenericAPIView):
+    permission_classes = IsAgencyAdmin,
+
+    def get(self, request):
+        agencies = Agency.objects.all()
+        if not request.user.is_superuser:
+            agencies = agencies.filter(id=request.user.agency_id)
+        agencies = agencies.annotate(admin_email=F('admin__email'))
+        return export_response(request, agencies, AGENCY_EXPORT_FIELDS, 'agencies')
+
+
 class AgencyListView(GenericAPIView):
     permission_classes = IsAgencyAdmin,
 
     def get(self, request):
-        agency_list = Agency.objects.all()
-        agency_detail = []
-        for agency in agency_list:
-            agency_detail.append({
-                **serialize_agency(agency)
-            })
         return Response(
             {
                 "result": True,
                 "data": {
-                    "agency": agency_detail
+                    "agency": AGENCY_PLAN.serialize(Agency.objects.all())
                 }
             },
             status=status.HTTP_201_CREATED
@@ -455,12 +421,14 @@ class AddAgencyView(GenericAPIView):
         if serializer.data.get('admin_id'):
             try:
                 admin = User.objects.get(id=serializer.data.get('admin_id'))
+                previous_agency_id = admin.agency_id
                 agency.admin = admin
                 agency.save()
                 admin.is_agency_admin = True
                 admin.is_agent = False
                 admin.agency = agency
                 admin.save()
+                bump_claims_version(previous_agency_id)
                 admin_id = serializer.data.get('admin_id')
             except ObjectDoesNotExist:
                 return Response(
@@ -618,6 +586,7 @@ class AgencyUpdateView(GenericAPIView):
                 )
         else:
             agency.save()
+        bump_claims_version(agency.id)
         data_source = serializer.data.get('data_source')
         if request.user.is_superuser:
             DataSource.objects.filter(agency=agency).update(agency=None)
@@ -659,29 +628,29 @@ class AgencyUpdateView(GenericAPIView):
         )
 
 
+def archive_response(msg, job):
+    if job is None:
+        return Response({"result": True, "data": {"msg": msg}})
+    return Response(
+        {
+            "result": True,
+            "data": {
+                "msg": msg,
+                "job": serialize_job(job)
+            },
+        },
+        status=status.HTTP_202_ACCEPTED
+    )
+
+
 class AgencyAchieveView(GenericAPIView):
     permission_classes = IsSuperUser,
 
     def get(self, request, pk):
         try:
             agency = Agency.objects.get(id=pk)
-            if agency.is_active:
-                agency.is_active = False
-                agency.save()
-                User.objects.filter(agency=agency).update(is_active=False)
-
-            else:
-                agency.is_active = True
-                agency.save()
-                User.objects.filter(agency=agency).update(is_active=True)
-            return Response(
-                {
-                    "result": True,
-                    "data": {
-                        "msg": "Agency archived."
-                    },
-                },
-            )
+            job = set_active('agency', agency, not agency.is_active, request.user)
+            return archive_response("Agency archived.", job)
         except ObjectDoesNotExist:
             return Response(
                 {
@@ -697,50 +666,57 @@ class TeamAchieveView(GenericAPIView):
     permission_classes = IsAgencyAdmin,
 
     def get(self, request, pk):
+        teams = Team.objects.all()
+        if not request.user.is_superuser:
+            teams = teams.filter(agency_id=request.user.agency_id)
         try:
-            team = Team.objects.get(id=pk)
-            if team.is_active:
-                team.is_active = False
-                team.save()
-            else:
-                team.is_active = True
-                team.save()
+            team = teams.get(id=pk)
+            job = set_active('team', team, not team.is_active, request.user)
+            return archive_response("Team archived.", job)
+        except ObjectDoesNotExist:
             return Response(
                 {
-                    "result": True,
+                    "result": False,
                     "data": {
-                        "msg": "Team archived."
+                        "msg": "Team archive failed."
                     },
                 },
             )
+
+
+class ArchiveJobView(GenericAPIView):
+    permission_classes = IsAgencyAdmin,
+
+    def get(self, request, pk):
+        jobs = ArchiveJob.objects.all()
+        if not request.user.is_superuser:
+            jobs = jobs.filter(
+                Q(scope='agency', scope_id=request.user.agency_id) |
+                Q(scope='team', scope_id__in=Team.objects.filter(agency_id=request.user.agency_id).values('id'))
+            )
+        try:
+            job = jobs.get(pk=pk)
         except ObjectDoesNotExist:
             return Response(
                 {
                     "result": False,
-                    "data": {
-                        "msg": "Team archive failed."
-                    },
+                    "errorCode": 1,
+                    "errorMsg": "Invalid job id."
                 },
+                status=status.HTTP_404_NOT_FOUND
             )
+        return Response({"result": True, "data": {"job": serialize_job(job)}})
 
 
 class DataSourceView(GenericAPIView):
     permission_classes = IsAgencyAdmin,
 
     def get(self, request):
-        data_source = DataSource.objects.filter(agency=None)
-        data_source_detail = []
-        for data in data_source:
-            data_source_detail.append({
-                "id": data.id,
-                "provider": data.provider,
-                "pcc": data.pcc
-            })
         return Response(
             {
                 "result": True,
                 "data": {
-                    "data_source": data_source_detail
+                    "data_source": DATA_SOURCE_PLAN.serialize(DataSource.objects.filter(agency=None))
                 }
             },
             status=status.HTTP_201_CREATED
@@ -753,18 +729,11 @@ class AvailableDataSourceView(GenericAPIView):
     def get(self, request, pk):
         agency = Agency.objects.get(id=pk)
         data_list = DataSource.objects.filter(Q(agency=agency) | Q(agency=None))
-        data_detail = []
-        for item in data_list:
-            data_detail.append({
-                "id": item.id,
-                "pcc": item.pcc,
-                "provider": item.provider
-            })
         return Response(
             {
                 "result": True,
                 "data": {
-                    "data_source": data_detail
+                    "data_source": DATA_SOURCE_PLAN.serialize(data_list)
                 }
             },
             status=status.HTTP_201_CREATED
@@ -776,16 +745,11 @@ class AgencyTeamsListView(GenericAPIView):
 
     def get(self, request, pk):
         team_list = Team.objects.filter(agency=pk)
-        team_detail = []
-        for team in team_list:
-            team_detail.append({
-                **serialize_team(team)
-            })
         return Response(
             {
                 "result": True,
                 "data": {
-                    "teams": team_detail
+                    "teams": TEAM_PLAN.serialize(team_list)
                 }
             },
             status=status.HTTP_201_CREATED
@@ -1,5 +1,10 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class UsersConfig(AppConfig):
     name = "users"
+
+    def ready(self):
+        from users import signals
+        post_migrate.connect(signals.create_availability_indexes, sender=self)
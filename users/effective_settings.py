@@ -0,0 +1,112 @@
+import copy
+
+from django.conf import settings
+from django.db.models import OuterRef, Subquery
+
+from common.cache import TTLCache
+from teams.models import DataSource
+from users.models import User
+
+PARAMETER_FIELDS = ('currency', 'date_type', 'booking_enabled', 'virtual_interlining', 'exclude_carriers')
+PARAMETER_DEFAULTS = {
+    'currency': 'USD',
+    'date_type': 'mm/dd/yyyy',
+    'booking_enabled': True,
+    'virtual_interlining': True,
+    'exclude_carriers': {},
+}
+
+settings_cache = TTLCache('effective_settings', settings.EFFECTIVE_SETTINGS_CACHE_SIZE,
+                          settings.EFFECTIVE_SETTINGS_CACHE_TTL)
+
+
+def get_role(user):
+    if user.is_superuser:
+        return 'superuser'
+    if user.is_agency_admin:
+        return 'agency_admin'
+    if user.is_team_lead:
+        return 'team_lead'
+    return 'agent'
+
+
+def _active_data_source(field):
+    return Subquery(
+        DataSource.objects.filter(agency=OuterRef('agency_id'), active=True).order_by('id').values(field)[:1]
+    )
+
+
+def merge_parameters(*layers):
+    # Layers are ordered by precedence; an empty value falls through to the next layer.
+    parameters = {}
+    for field in PARAMETER_FIELDS:
+        # Copied so cached entries never share the mutable defaults.
+        parameters[field] = copy.copy(PARAMETER_DEFAULTS[field])
+        for layer in layers:
+            if layer is not None and getattr(layer, field) not in (None, ''):
+                parameters[field] = getattr(layer, field)
+                break
+    return parameters
+
+
+def load_effective_settings(user_id):
+    user = User.objects.select_related(
+        'common_parameters', 'team__common_parameters', 'agency__common_parameters'
+    ).annotate(
+        data_source_pcc=_active_data_source('pcc'),
+        data_source_provider=_active_data_source('provider'),
+        data_source_queue=_active_data_source('queue'),
+    ).get(pk=user_id)
+    team = user.team
+    agency = user.agency
+
+    effective = {
+        'user_id': user.id,
+        'email': user.email,
+        'username': user.username,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'role': get_role(user),
+        'is_superuser': user.is_superuser,
+        'is_agency_admin': user.is_agency_admin,
+        'is_team_lead': user.is_team_lead,
+        'is_agent': user.is_agent,
+        'search_endpoint': user.search_endpoint,
+        'booking_endpoint': user.booking_endpoint,
+        'team_id': user.team_id,
+        'team_name': team.name if team else None,
+        'team_booking': team.is_booking if team else None,
+        'agency_id': user.agency_id,
+        'agency_name': agency.name if agency else None,
+        'student_and_youth': agency.student_and_youth if agency else False,
+        'claims_version': agency.claims_version if agency else 0,
+        'pcc': user.data_source_pcc,
+        'provider': user.data_source_provider,
+        'queue': user.data_source_queue,
+        **merge_parameters(
+            user.common_parameters,
+            team.common_parameters if team else None,
+            agency.common_parameters if agency else None
+        )
+    }
+    tags = [
+        ('user', user.id),
+        ('team', user.team_id),
+        ('agency', user.agency_id),
+        ('common_parameters', user.common_parameters_id),
+        ('common_parameters', team.common_parameters_id if team else None),
+        ('common_parameters', agency.common_parameters_id if agency else None),
+    ]
+    return effective, [tag for tag in tags if tag[1] is not None]
+
+
+def get_effective_settings(user_id):
+    effective = settings_cache.get(user_id)
+    if effective is None:
+        effective, tags = load_effective_settings(user_id)
+        settings_cache.set(user_id, effective, tags=tags)
+    return effective
+
+
+def invalidate_effective_settings(*tags):
+    settings_cache.invalidate_tag(*tags)
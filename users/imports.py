@@ -0,0 +1,149 @@
+import codecs
+import csv
+import json
+import logging
+import os
+from collections import Counter
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from common import jobs as job_queue
+from common.jobs import JobCancelled
+from users.models import UserImportError, UserImportJob
+from users.provisioning import CREATED, DUPLICATE, INVALID, provision_users
+
+logger = logging.getLogger(__name__)
+IMPORT_FORMATS = ('csv', 'ndjson')
+
+
+def import_format(filename, requested=None):
+    if requested:
+        return requested
+    return 'ndjson' if os.path.splitext(filename or '')[1].lower() in ('.ndjson', '.jsonl') else 'csv'
+
+
+def iter_emails(job):
+    """Yield one email per data row of the job's upload; None for rows that cannot be read.
+
+    CSV files use their ``email`` column, or the first column when there is no such
+    header. NDJSON lines are ``{"email": ...}`` objects or bare strings. Blank lines
+    are skipped, so row numbers stay stable between runs.
+    """
+    with job.source.open('rb') as source:
+        lines = codecs.iterdecode(source, 'utf-8-sig')
+        if job.file_format == 'ndjson':
+            for line in lines:
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    yield None
+                    continue
+                yield row.get('email') if isinstance(row, dict) else row if isinstance(row, str) else None
+            return
+
+        reader = csv.reader(lines)
+        column = 0
+        for row in reader:
+            if not row:
+                continue
+            header = [value.strip().lower() for value in row]
+            if 'email' in header:
+                column = header.index('email')
+            else:
+                yield row[0]
+            break
+        for row in reader:
+            if row:
+                yield row[column] if len(row) > column else None
+
+
+def claim_job(worker):
+    return job_queue.claim_job(UserImportJob.objects.select_related('agency', 'team'), worker,
+                               settings.USER_IMPORT_STALE_AFTER)
+
+
+def run_job(job, chunk_size=None):
+    """Provision the job's rows chunk by chunk, resuming after ``processed_rows``.
+
+    Each chunk commits together with its progress, so a crashed worker loses at most
+    the chunk in flight. A cancel lands between chunks and rolls back the current one.
+    """
+    chunk_size = chunk_size or settings.USER_IMPORT_CHUNK_SIZE
+    jobs = UserImportJob.objects.filter(pk=job.pk, status=UserImportJob.RUNNING, worker=job.worker)
+    if job.total_rows is None:
+        job.total_rows = sum(1 for _ in iter_emails(job))
+        if not jobs.update(total_rows=job.total_rows):
+            raise JobCancelled
+    rows = islice(enumerate(iter_emails(job), 1), job.processed_rows, None)
+
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        with transaction.atomic():
+            results = provision_users([email for number, email in chunk], job.agency, job.team, job.password,
+                                      job.is_active)
+            counts = Counter(result['status'] for result in results)
+            UserImportError.objects.bulk_create([
+                UserImportError(job_id=job.pk, row_number=number, email=result['email'], status=result['status'])
+                for (number, email), result in zip(chunk, results) if result['status'] != CREATED
+            ])
+            if not jobs.update(
+                processed_rows=F('processed_rows') + len(chunk),
+                created_count=F('created_count') + counts[CREATED],
+                duplicate_count=F('duplicate_count') + counts[DUPLICATE],
+                invalid_count=F('invalid_count') + counts[INVALID],
+                heartbeat_at=timezone.now()
+            ):
+                raise JobCancelled
+
+    jobs.update(status=UserImportJob.DONE, finished_at=timezone.now())
+
+
+def process_next_job(worker, chunk_size=None):
+    """Claim and run one job; return it, or None when the queue is empty."""
+    job = claim_job(worker)
+    if job is None:
+        return None
+    try:
+        run_job(job, chunk_size)
+    except JobCancelled:
+        logger.info('Import job %d was cancelled.', job.pk)
+    except Exception as exc:
+        logger.exception('Import job %d failed.', job.pk)
+        UserImportJob.objects.filter(pk=job.pk, status=UserImportJob.RUNNING, worker=worker).update(
+            status=UserImportJob.FAILED, message=str(exc), finished_at=timezone.now()
+        )
+    return job
+
+
+def cancel_job(job):
+    return bool(UserImportJob.objects.filter(
+        pk=job.pk, status__in=(UserImportJob.QUEUED, UserImportJob.RUNNING)
+    ).update(status=UserImportJob.CANCELLED, finished_at=timezone.now()))
+
+
+def serialize_job(job):
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "file_format": job.file_format,
+        "agency_id": job.agency_id,
+        "team_id": job.team_id,
+        "total_rows": job.total_rows,
+        "processed_rows": job.processed_rows,
+        "created": job.created_count,
+        "duplicate": job.duplicate_count,
+        "invalid": job.invalid_count,
+        "has_errors": bool(job.duplicate_count or job.invalid_count),
+        "message": job.message,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from common.models import CommonParameters
+from teams.models import Team
+from users.effective_settings import PARAMETER_FIELDS, merge_parameters
+from users.models import User
+
+
+def team_inherited(team):
+    return merge_parameters(team.agency.common_parameters if team.agency else None)
+
+
+def user_inherited(user):
+    return merge_parameters(
+        user.team.common_parameters if user.team else None,
+        user.agency.common_parameters if user.agency else None
+    )
+
+
+def is_clone(parameters, inherited):
+    # Empty fields already inherit, so only the filled ones have to match.
+    return all(
+        getattr(parameters, field) in (None, '', inherited[field]) for field in PARAMETER_FIELDS
+    )
+
+
+class Command(BaseCommand):
+    help = ('Detach and delete team and user CommonParameters rows that are identical clones of what they '
+            'would inherit, so they follow their agency again.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Only count the clones.')
+
+    def collapse(self, model, related, inherited, batch_size, dry_run):
+        owners = model.objects.filter(common_parameters__isnull=False).select_related(
+            'common_parameters', *related
+        ).order_by('id')
+        collapsed = last_id = 0
+        while True:
+            batch = list(owners.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            clones = [owner for owner in batch if is_clone(owner.common_parameters, inherited(owner))]
+            collapsed += len(clones)
+            if clones and not dry_run:
+                with transaction.atomic():
+                    # Detach first: the foreign keys cascade on delete.
+                    model.objects.filter(id__in=[owner.id for owner in clones]).update(common_parameters=None)
+                    CommonParameters.objects.filter(id__in=[owner.common_parameters_id for owner in clones]).delete()
+        self.stdout.write('%s: %d identical clones%s.' % (
+            model.__name__, collapsed, '' if dry_run else ' collapsed'
+        ))
+
+    def handle(self, *args, **options):
+        # Teams first, so users compare against what their team resolves to afterwards.
+        self.collapse(Team, ('agency__common_parameters',), team_inherited, options['batch_size'], options['dry_run'])
+        self.collapse(User, ('team__common_parameters', 'agency__common_parameters'), user_inherited,
+                      options['batch_size'], options['dry_run'])
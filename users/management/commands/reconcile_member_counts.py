@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q
+
+from users.member_counts import GROUPS, member_count_expression, recount
+
+
+class Command(BaseCommand):
+    help = 'Report and repair drift in the member_count/active_member_count counters of teams and agencies.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Only report drifted rows.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        for model, fk in GROUPS:
+            drifted = model.objects.annotate(
+                actual_members=member_count_expression(fk),
+                actual_active_members=member_count_expression(fk, is_active=True)
+            ).filter(
+                ~Q(member_count=F('actual_members')) | ~Q(active_member_count=F('actual_active_members'))
+            ).order_by('id').values_list('id', 'member_count', 'actual_members', 'active_member_count',
+                                         'actual_active_members')
+
+            ids = []
+            for group_id, members, actual, active, actual_active in drifted.iterator():
+                self.stdout.write('%s %d: members %d -> %d, active %d -> %d' % (
+                    model.__name__, group_id, members, actual, active, actual_active
+                ))
+                ids.append(group_id)
+
+            if not options['dry_run']:
+                for start in range(0, len(ids), batch_size):
+                    recount(model, fk, ids[start:start + batch_size])
+            self.stdout.write('%s: %d drifted%s.' % (
+                model.__name__, len(ids), '' if options['dry_run'] else ', repaired'
+            ))
@@ -0,0 +1,31 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from common.jobs import worker_name
+from users.imports import process_next_job
+
+
+class Command(BaseCommand):
+    help = 'Work through queued user import jobs, using the database as the queue.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=settings.USER_IMPORT_CHUNK_SIZE)
+        parser.add_argument('--poll-interval', type=int, default=settings.USER_IMPORT_POLL_INTERVAL,
+                            help='Seconds to wait when the queue is empty.')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty.')
+
+    def handle(self, *args, **options):
+        worker = worker_name()
+        while True:
+            job = process_next_job(worker, options['chunk_size'])
+            if job is not None:
+                job.refresh_from_db()
+                self.stdout.write('Import job %d: %s, %d/%s rows, %d created.' % (
+                    job.pk, job.status, job.processed_rows, job.total_rows, job.created_count
+                ))
+                continue
+            if options['once']:
+                break
+            time.sleep(options['poll_interval'])
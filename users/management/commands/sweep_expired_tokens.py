@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from users.reset_tokens import sweep_expired_reset_tokens
+from users.revocation import sweep_expired_revocations
+
+
+class Command(BaseCommand):
+    help = 'Delete expired password reset tokens and revocation entries in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--interval', type=int, default=0,
+                            help='Seconds between sweeps; 0 sweeps once and exits.')
+
+    def handle(self, *args, **options):
+        while True:
+            deleted = sweep_expired_reset_tokens(options['batch_size'])
+            self.stdout.write('Deleted %d expired password reset tokens.' % deleted)
+            deleted = sweep_expired_revocations(options['batch_size'])
+            self.stdout.write('Deleted %d expired revocation entries.' % deleted)
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
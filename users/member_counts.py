@@ -0,0 +1,94 @@
+from collections import Counter
+from contextlib import contextmanager
+
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from teams.models import Agency, Team
+from users.models import User
+
+# (model, User foreign key) pairs that carry member_count / active_member_count.
+GROUPS = ((Team, 'team'), (Agency, 'agency'))
+TRACKED_FIELDS = ('team_id', 'agency_id', 'is_active')
+
+
+def snapshot(user):
+    if any(field in user.get_deferred_fields() for field in TRACKED_FIELDS):
+        return None
+    return tuple(getattr(user, field) for field in TRACKED_FIELDS)
+
+
+def _deltas(state, sign, deltas):
+    if state is None:
+        return
+    team_id, agency_id, is_active = state
+    for model, group_id in ((Team, team_id), (Agency, agency_id)):
+        if group_id is not None:
+            deltas[(model, group_id, 'member_count')] += sign
+            if is_active:
+                deltas[(model, group_id, 'active_member_count')] += sign
+
+
+def apply_member_change(previous, current):
+    """Move a user's contribution to the counters from ``previous`` to ``current``.
+
+    Both are ``snapshot()`` tuples, or None for "not a member of anything".
+    """
+    deltas = Counter()
+    _deltas(previous, -1, deltas)
+    _deltas(current, 1, deltas)
+
+    updates = {}
+    for (model, group_id, field), delta in deltas.items():
+        if delta:
+            updates.setdefault((model, group_id), {})[field] = F(field) + delta
+    for (model, group_id), fields in updates.items():
+        model.objects.filter(id=group_id).update(**fields)
+
+
+def shift_active_members(groups, delta):
+    """Add ``delta`` to active_member_count once per ``(team_id, agency_id)`` pair in ``groups``."""
+    deltas = Counter()
+    for team_id, agency_id in groups:
+        for model, group_id in ((Team, team_id), (Agency, agency_id)):
+            if group_id is not None:
+                deltas[(model, group_id)] += delta
+    for (model, group_id), change in deltas.items():
+        model.objects.filter(id=group_id).update(active_member_count=F('active_member_count') + change)
+
+
+def member_count_expression(fk, **filters):
+    members = User.objects.filter(**{fk: OuterRef('pk')}, **filters).order_by().values(fk)
+    return Coalesce(Subquery(members.annotate(total=Count('pk')).values('total')), Value(0))
+
+
+def recount(model, fk, ids=None):
+    groups = model.objects.all() if ids is None else model.objects.filter(id__in=ids)
+    return groups.update(
+        member_count=member_count_expression(fk),
+        active_member_count=member_count_expression(fk, is_active=True)
+    )
+
+
+def recount_members(team_ids=(), agency_ids=()):
+    team_ids = [team_id for team_id in set(team_ids) if team_id is not None]
+    agency_ids = [agency_id for agency_id in set(agency_ids) if agency_id is not None]
+    if team_ids:
+        recount(Team, 'team', team_ids)
+    if agency_ids:
+        recount(Agency, 'agency', agency_ids)
+
+
+@contextmanager
+def recounting(users, team_ids=(), agency_ids=()):
+    """Recount the teams and agencies ``users`` belong to, plus the given ids, after the block.
+
+    Queryset ``update()`` calls skip the signals that maintain the counters, so wrap
+    them in this and pass the groups the users are being moved into.
+    """
+    groups = set(users.order_by().values_list('team_id', 'agency_id').distinct())
+    yield
+    recount_members(
+        [team_id for team_id, agency_id in groups] + list(team_ids),
+        [agency_id for team_id, agency_id in groups] + list(agency_ids)
+    )
@@ -1,12 +1,23 @@
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, UserManager
 from django.db import models
+from django.utils import timezone
 from common.models import CommonParameters
 from teams.models import Agency, Team
 
+# Columns the search endpoints sort on; each gets a (scope, column, id) index.
+USER_SORT_COLUMNS = ('username', 'email', 'last_login', 'created_at', 'is_active')
+
 
 class User(AbstractBaseUser, PermissionsMixin):
     class Meta:
         db_table = 'user'
+        indexes = [
+            models.Index(fields=[scope, column, 'id'], name='user_%s_%s_idx' % (scope, column))
+            for scope in ('agency', 'team') for column in USER_SORT_COLUMNS
+        ] + [
+            models.Index(fields=[column, 'id'], name='user_%s_idx' % column)
+            for column in ('username', 'last_login', 'created_at')
+        ]
 
     email = models.EmailField(unique=True)
     username = models.CharField(max_length=100)
@@ -27,9 +38,73 @@ class User(AbstractBaseUser, PermissionsMixin):
     booking_endpoint = models.CharField(max_length=8, choices=ENDPOINT_CHOICES, default="prod")
     password_reset_token = models.CharField(null=True, max_length=100)
     password_reset_sent_at = models.DateTimeField(null=True)
+    created_at = models.DateTimeField(default=timezone.now)
     objects = UserManager()
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = []
 
     def __str__(self):
         return self.email
+
+
+class PasswordResetToken(models.Model):
+    class Meta:
+        db_table = 'password_reset_token'
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='password_reset_tokens')
+    token_hash = models.CharField(max_length=64, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+
+class RevokedToken(models.Model):
+    class Meta:
+        db_table = 'revoked_token'
+
+    # "jti:<jti>" revokes one token; "user:<id>", "team:<id>" and "agency:<id>" revoke everything issued
+    # before revoked_at
+    key = models.CharField(max_length=64, unique=True)
+    revoked_at = models.DateTimeField()
+    expires_at = models.DateTimeField(db_index=True)
+
+
+class UserImportJob(models.Model):
+    class Meta:
+        db_table = 'user_import_job'
+        indexes = [models.Index(fields=['status', 'id'], name='user_import_job_status_idx')]
+
+    QUEUED, RUNNING, DONE, FAILED, CANCELLED = 'queued', 'running', 'done', 'failed', 'cancelled'
+    STATUS_CHOICES = [(QUEUED, QUEUED), (RUNNING, RUNNING), (DONE, DONE), (FAILED, FAILED), (CANCELLED, CANCELLED)]
+    FORMAT_CHOICES = [("csv", "csv"), ("ndjson", "ndjson")]
+    agency = models.ForeignKey(Agency, on_delete=models.CASCADE, related_name='import_jobs')
+    team = models.ForeignKey(Team, on_delete=models.SET_NULL, related_name='import_jobs', null=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, related_name='import_jobs', null=True)
+    source = models.FileField(upload_to='imports/')
+    file_format = models.CharField(max_length=8, choices=FORMAT_CHOICES, default="csv")
+    password = models.CharField(max_length=128)
+    is_active = models.BooleanField(default=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    total_rows = models.IntegerField(null=True)
+    # Rows whose outcome is committed; a reclaimed job resumes after them.
+    processed_rows = models.IntegerField(default=0)
+    created_count = models.IntegerField(default=0)
+    duplicate_count = models.IntegerField(default=0)
+    invalid_count = models.IntegerField(default=0)
+    message = models.TextField(blank=True, default='')
+    worker = models.CharField(max_length=100, blank=True, default='')
+    heartbeat_at = models.DateTimeField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True)
+    finished_at = models.DateTimeField(null=True)
+
+
+class UserImportError(models.Model):
+    class Meta:
+        db_table = 'user_import_error'
+        indexes = [models.Index(fields=['job', 'row_number'], name='user_import_error_row_idx')]
+
+    # Written in the transaction of the chunk that produced it, so rolled-back chunks leave none behind.
+    job = models.ForeignKey(UserImportJob, on_delete=models.CASCADE, related_name='errors', db_index=False)
+    row_number = models.IntegerField()
+    email = models.TextField()
+    status = models.CharField(max_length=10)
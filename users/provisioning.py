@@ -0,0 +1,86 @@
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+
+from common.availability import taken_values
+from users.member_counts import recount_members
+from users.models import User
+
+PROVISION_BATCH_SIZE = 500
+CREATED, DUPLICATE, INVALID = 'created', 'duplicate', 'invalid'
+
+
+def taken_emails(emails):
+    """Return the lower-cased addresses among ``emails`` that already belong to a user, in one query."""
+    return taken_values(User.objects.all(), 'email', emails)
+
+
+def _classify(emails):
+    statuses, valid, seen = [], [], set()
+    for email in emails:
+        email = (email or '').strip() if isinstance(email, str) else ''
+        try:
+            validate_email(email)
+        except ValidationError:
+            statuses.append([email, INVALID])
+            continue
+        if email.lower() in seen:
+            statuses.append([email, DUPLICATE])
+            continue
+        seen.add(email.lower())
+        statuses.append([email, CREATED])
+        valid.append(email)
+    return statuses, valid
+
+
+def _truncate(field, value):
+    return value[:User._meta.get_field(field).max_length]
+
+
+def _insert(emails, agency, team, password, is_active):
+    with transaction.atomic():
+        for start in range(0, len(emails), PROVISION_BATCH_SIZE):
+            batch = emails[start:start + PROVISION_BATCH_SIZE]
+            User.objects.bulk_create([
+                User(
+                    email=email,
+                    username=_truncate('username', email),
+                    first_name=_truncate('first_name', email),
+                    last_name=_truncate('last_name', email),
+                    agency=agency,
+                    team=team,
+                    password=password,
+                    is_active=is_active,
+                    is_agent=True,
+                )
+                for email in batch
+            ], batch_size=PROVISION_BATCH_SIZE)
+
+
+def provision_users(emails, agency, team=None, password=None, is_active=True):
+    """Create agents for ``emails`` in ``agency``/``team`` and return ``[{"email", "status"}]``.
+
+    Statuses are ``created``, ``duplicate`` (already registered, or repeated in the
+    request; compared case-insensitively) and ``invalid``. All users are inserted in
+    one transaction, so either every ``created`` row exists or none does.
+    """
+    statuses, candidates = _classify(emails)
+    for attempt in range(2):
+        taken = taken_emails(candidates)
+        new = [email for email in candidates if email.lower() not in taken]
+        try:
+            _insert(new, agency, team, password, is_active)
+            break
+        except IntegrityError:
+            # Someone registered one of the addresses since the pre-check; check again.
+            if attempt:
+                raise
+
+    for entry in statuses:
+        if entry[1] == CREATED and entry[0].lower() in taken:
+            entry[1] = DUPLICATE
+
+    if new:
+        # bulk_create sends no post_save; the search index catches up on new ids by itself.
+        recount_members([team.id] if team else [], [agency.id])
+    return [{"email": email, "status": status} for email, status in statuses]
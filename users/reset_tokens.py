@@ -0,0 +1,43 @@
+import hashlib
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from users.models import PasswordResetToken
+
+
+def hash_reset_token(token):
+    return hashlib.sha256(str(token).encode()).hexdigest()
+
+
+def issue_reset_token(user):
+    token = uuid.uuid4()
+    PasswordResetToken.objects.filter(user=user).delete()
+    PasswordResetToken.objects.create(
+        user=user,
+        token_hash=hash_reset_token(token),
+        expires_at=timezone.now() + timedelta(seconds=settings.PASSWORD_RESET_TOKEN_TTL)
+    )
+    return token
+
+
+def find_reset_token(token):
+    if not token:
+        return None
+    return PasswordResetToken.objects.select_related('user').filter(
+        token_hash=hash_reset_token(token),
+        expires_at__gt=timezone.now()
+    ).first()
+
+
+def sweep_expired_reset_tokens(batch_size):
+    deleted = 0
+    while True:
+        ids = list(PasswordResetToken.objects.filter(
+            expires_at__lte=timezone.now()
+        ).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += PasswordResetToken.objects.filter(id__in=ids).delete()[0]
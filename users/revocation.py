@@ -0,0 +1,109 @@
+import threading
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from common import metrics
+from common.bloom import BloomFilter
+from users.models import RevokedToken
+
+
+def token_issued_at(token):
+    # Tokens issued before the sub-second iat claim fall back to whole-second exp.
+    if token.get('iat') is not None:
+        return token['iat']
+    return token['exp'] - token.lifetime.total_seconds()
+
+
+class RevocationList(object):
+    """Per-worker copy of the revoked_token table.
+
+    A Bloom filter answers the common "not revoked" case; positives are confirmed
+    against the exact mapping. Both are rebuilt from the table every
+    ``refresh_interval`` seconds so revocations made by other workers show up.
+    """
+
+    def __init__(self, refresh_interval):
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self._bloom = BloomFilter(1024)
+        self._revoked = {}
+
+    def rebuild(self):
+        rows = RevokedToken.objects.filter(expires_at__gt=timezone.now()).values_list('key', 'revoked_at')
+        revoked = {key: revoked_at.timestamp() for key, revoked_at in rows}
+        bloom = BloomFilter(max(1024, len(revoked) * 2))
+        for key in revoked:
+            bloom.add(key)
+        with self._lock:
+            self._bloom, self._revoked = bloom, revoked
+            self._loaded_at = time.monotonic()
+        metrics.set_gauge('revocation.entries', len(revoked))
+
+    def _ensure_fresh(self):
+        loaded_at = self._loaded_at
+        if loaded_at is None or time.monotonic() - loaded_at > self.refresh_interval:
+            self.rebuild()
+
+    def _revoked_at(self, key):
+        if key not in self._bloom:
+            return None
+        return self._revoked.get(key)
+
+    def is_revoked(self, token):
+        self._ensure_fresh()
+        if self._revoked_at('jti:%s' % token.get(jwt_settings.JTI_CLAIM)) is not None:
+            return True
+
+        issued_at = token_issued_at(token)
+        for key in ('user:%s' % token.get(jwt_settings.USER_ID_CLAIM), 'agency:%s' % token.get('agency_id'),
+                    'team:%s' % token.get('team_id')):
+            revoked_at = self._revoked_at(key)
+            if revoked_at is not None and issued_at <= revoked_at:
+                return True
+        return False
+
+    def _store(self, key, expires_at):
+        revoked_at = timezone.now()
+        RevokedToken.objects.update_or_create(key=key, defaults={'revoked_at': revoked_at, 'expires_at': expires_at})
+        with self._lock:
+            self._bloom.add(key)
+            self._revoked[key] = revoked_at.timestamp()
+        metrics.incr('revocation.%s' % key.split(':', 1)[0])
+
+    def revoke_token(self, token):
+        expires_at = datetime.fromtimestamp(token['exp'], tz=timezone.utc)
+        self._store('jti:%s' % token[jwt_settings.JTI_CLAIM], expires_at)
+
+    def revoke_user(self, *user_ids):
+        expires_at = timezone.now() + jwt_settings.REFRESH_TOKEN_LIFETIME
+        for user_id in user_ids:
+            self._store('user:%s' % user_id, expires_at)
+
+    def revoke_agency(self, *agency_ids):
+        expires_at = timezone.now() + jwt_settings.REFRESH_TOKEN_LIFETIME
+        for agency_id in agency_ids:
+            self._store('agency:%s' % agency_id, expires_at)
+
+    def revoke_team(self, *team_ids):
+        expires_at = timezone.now() + jwt_settings.REFRESH_TOKEN_LIFETIME
+        for team_id in team_ids:
+            self._store('team:%s' % team_id, expires_at)
+
+
+def sweep_expired_revocations(batch_size):
+    deleted = 0
+    while True:
+        ids = list(RevokedToken.objects.filter(
+            expires_at__lte=timezone.now()
+        ).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += RevokedToken.objects.filter(id__in=ids).delete()[0]
+
+
+revocation_list = RevocationList(settings.JWT_REVOCATION_REFRESH_INTERVAL)
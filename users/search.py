@@ -0,0 +1,265 @@
+import heapq
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from common import metrics
+from common.sorting import ID_DESC
+from users.models import User
+
+SEARCH_FIELDS = ('username', 'email', 'first_name', 'last_name')
+# Raw values kept per document so keyword results can be sorted without the database.
+SORT_FIELDS = ('username', 'email', 'last_login', 'created_at', 'is_active')
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class BaseUserSearchBackend(object):
+
+    def search(self, keyword, scope=None, offset=0, limit=None, sort=ID_DESC, after=None, reverse=False):
+        """Return ``(rows, total)`` for users matching ``keyword``; rows are ``(id, sort value)``.
+
+        ``scope`` is None for every user, or ``('agency', id)`` / ``('team', id)``.
+        Rows come in ``sort`` order, or against it with ``reverse``, starting after the
+        ``(value, id)`` keyset bound ``after``. ``total`` ignores the bound, and is None
+        when the backend leaves counting to ``queryset()``.
+        """
+        raise NotImplementedError
+
+    def queryset(self, keyword, scope=None):
+        raise NotImplementedError
+
+    def index(self, user):
+        pass
+
+    def refresh(self, *user_ids):
+        """Re-read users changed by queryset updates, which send no signals."""
+        pass
+
+    def remove(self, user_id):
+        pass
+
+    def move_team(self, team_id, new_team_id):
+        pass
+
+
+class DatabaseUserSearchBackend(BaseUserSearchBackend):
+
+    def queryset(self, keyword, scope=None):
+        users = User.objects.all()
+        if scope is not None:
+            users = users.filter(**{scope[0]: scope[1]})
+        if keyword:
+            users = users.filter(username__icontains=keyword)
+        return users
+
+    def search(self, keyword, scope=None, offset=0, limit=None, sort=ID_DESC, after=None, reverse=False):
+        users = self.queryset(keyword, scope)
+        descending = sort.descending != reverse
+        if after is not None:
+            users = users.filter(sort.after(after[0], after[1], descending))
+        rows = users.order_by(*sort.ordering(descending)).values_list('id', sort.field)
+        end = offset + limit if limit is not None else None
+        return list(rows[offset:end]), None
+
+
+class TrigramUserSearchBackend(BaseUserSearchBackend):
+    """In-process inverted index from trigrams to user ids.
+
+    Writes made by this worker are applied through signals; rows inserted by other
+    workers are picked up by an ``id > max_id`` catch-up on every search, and the
+    whole index is rebuilt in the background every ``rebuild_interval`` seconds.
+    Writes that land while a rebuild reads the table are replayed onto the new index
+    before it is swapped in.
+    """
+
+    def __init__(self, rebuild_interval=None):
+        self.rebuild_interval = rebuild_interval or settings.USER_SEARCH_REBUILD_INTERVAL
+        self._lock = threading.RLock()
+        self._building = False
+        self._built_at = None
+        self._pending = None
+        self._reset()
+
+    def _reset(self):
+        self._documents = {}
+        self._postings = defaultdict(set)
+        self._scopes = defaultdict(set)
+        self._max_id = 0
+
+    def _rows(self, users):
+        return users.order_by('id').values_list(
+            'id', 'agency_id', 'team_id', *SEARCH_FIELDS, *SORT_FIELDS
+        ).iterator(chunk_size=5000)
+
+    def _add(self, user_id, agency_id, team_id, *fields):
+        # Fields are indexed separately so no trigram spans two of them.
+        values = tuple((value or '').lower() for value in fields[:len(SEARCH_FIELDS)])
+        sort_values = dict(zip(SORT_FIELDS, fields[len(SEARCH_FIELDS):]))
+        grams = set()
+        for value in values:
+            grams |= trigrams(value)
+        self._drop(user_id)
+        self._documents[user_id] = (agency_id, team_id, values, grams, sort_values)
+        for gram in grams:
+            self._postings[gram].add(user_id)
+        self._scopes[('agency', agency_id)].add(user_id)
+        self._scopes[('team', team_id)].add(user_id)
+        self._max_id = max(self._max_id, user_id)
+
+    def _drop(self, user_id):
+        document = self._documents.pop(user_id, None)
+        if document is None:
+            return
+        agency_id, team_id, values, grams, sort_values = document
+        for gram in grams:
+            self._postings[gram].discard(user_id)
+        self._scopes[('agency', agency_id)].discard(user_id)
+        self._scopes[('team', team_id)].discard(user_id)
+
+    def _apply(self, method, *args):
+        # Callers hold the lock.
+        getattr(self, method)(*args)
+        if self._pending is not None:
+            self._pending.append((method, args))
+
+    def rebuild(self):
+        start = time.perf_counter()
+        with self._lock:
+            self._pending = []
+        try:
+            fresh = TrigramUserSearchBackend(self.rebuild_interval)
+            for row in self._rows(User.objects.all()):
+                fresh._add(*row)
+            with self._lock:
+                # The read may predate these writes; replay them so none is lost in the swap.
+                for method, args in self._pending:
+                    getattr(fresh, method)(*args)
+                self._documents, self._postings = fresh._documents, fresh._postings
+                self._scopes, self._max_id = fresh._scopes, fresh._max_id
+                self._built_at = time.monotonic()
+        finally:
+            with self._lock:
+                self._pending = None
+        metrics.observe('search.rebuild', time.perf_counter() - start)
+        metrics.set_gauge('search.documents', len(self._documents))
+
+    def _background_rebuild(self):
+        try:
+            self.rebuild()
+        finally:
+            self._building = False
+
+    def _ensure_fresh(self):
+        if self._built_at is None:
+            with self._lock:
+                if self._built_at is None:
+                    self.rebuild()
+            return
+
+        if time.monotonic() - self._built_at > self.rebuild_interval and not self._building:
+            self._building = True
+            threading.Thread(target=self._background_rebuild, daemon=True).start()
+
+        rows = list(self._rows(User.objects.filter(id__gt=self._max_id)))
+        if rows:
+            with self._lock:
+                for row in rows:
+                    self._apply('_add', *row)
+
+    def _candidates(self, keyword, scope):
+        with self._lock:
+            scoped = self._documents.keys() if scope is None else self._scopes.get(scope, set())
+            if not keyword:
+                return set(scoped)
+
+            if len(keyword) < 3:
+                candidates = scoped
+            else:
+                postings = sorted((self._postings.get(gram, set()) for gram in trigrams(keyword)), key=len)
+                candidates = set(postings[0]).intersection(*postings[1:])
+                if scope is not None:
+                    candidates &= scoped
+
+            # Trigram hits are only a superset; confirm the substring on the stored values.
+            documents = self._documents
+            return {
+                user_id for user_id in candidates
+                if any(keyword in value for value in documents[user_id][2])
+            }
+
+    def _sort_value(self, user_id, field):
+        return user_id if field == 'id' else self._documents[user_id][4][field]
+
+    def search(self, keyword, scope=None, offset=0, limit=None, sort=ID_DESC, after=None, reverse=False):
+        with metrics.timer('search.users'):
+            self._ensure_fresh()
+            descending = sort.descending != reverse
+            with self._lock:
+                matches = self._candidates((keyword or '').lower(), scope)
+                if sort.field == 'id':
+                    # Ids order themselves; skip building keys on the default sort.
+                    key, rank = None, int
+                else:
+                    values = {user_id: self._sort_value(user_id, sort.field) for user_id in matches}
+
+                    def key(user_id):
+                        return sort.key(values[user_id], user_id)
+                    rank = key
+
+                window = matches
+                if after is not None:
+                    bound = rank(after[1]) if key is None else sort.key(*after)
+                    if descending:
+                        window = [user_id for user_id in matches if rank(user_id) < bound]
+                    else:
+                        window = [user_id for user_id in matches if rank(user_id) > bound]
+
+                if limit is None:
+                    ids = sorted(window, key=key, reverse=descending)
+                else:
+                    ids = (heapq.nlargest if descending else heapq.nsmallest)(offset + limit, window, key=key)
+                rows = [(user_id, self._sort_value(user_id, sort.field)) for user_id in ids[offset:]]
+            return rows, len(matches)
+
+    def index(self, user):
+        if self._built_at is None:
+            return
+        with self._lock:
+            self._apply('_add', user.pk, user.agency_id, user.team_id,
+                        *(getattr(user, field) for field in SEARCH_FIELDS + SORT_FIELDS))
+
+    def refresh(self, *user_ids):
+        if self._built_at is None or not user_ids:
+            return
+        rows = list(self._rows(User.objects.filter(id__in=user_ids)))
+        found = {row[0] for row in rows}
+        with self._lock:
+            for row in rows:
+                self._apply('_add', *row)
+            for user_id in user_ids:
+                if user_id not in found:
+                    self._apply('_drop', user_id)
+
+    def remove(self, user_id):
+        with self._lock:
+            self._apply('_drop', user_id)
+
+    def _move_team(self, team_id, new_team_id):
+        for user_id in list(self._scopes.get(('team', team_id), ())):
+            agency_id, _, values, grams, sort_values = self._documents[user_id]
+            self._scopes[('team', team_id)].discard(user_id)
+            self._scopes[('team', new_team_id)].add(user_id)
+            self._documents[user_id] = (agency_id, new_team_id, values, grams, sort_values)
+
+    def move_team(self, team_id, new_team_id):
+        with self._lock:
+            self._apply('_move_team', team_id, new_team_id)
+
+
+user_search = import_string(settings.USER_SEARCH_BACKEND)()
@@ -1,8 +1,9 @@
 from django.utils.translation import ugettext_lazy as _
 from rest_framework import serializers
-from django.contrib.auth.hashers import make_password
 from django.core.exceptions import ObjectDoesNotExist
+from common.availability import check_batch_size
 from common.exception import CustomException
+from common.hashing import make_password
 
 from users.models import User
 from teams.models import Agency, Team
@@ -102,6 +103,22 @@ class BulkAddUserSerializer(serializers.ModelSerializer):
         return attrs
 
 
+class UserImportSerializer(BulkAddUserSerializer):
+    file = serializers.FileField()
+    file_format = serializers.ChoiceField(choices=("csv", "ndjson"), required=False)
+
+    class Meta:
+        model = User
+        fields = ("file", "file_format", "team_id", "agency_id", "is_active", "password")
+
+
+class EmailBatchCheckSerializer(serializers.Serializer):
+    emails = serializers.ListField(child=serializers.CharField(allow_blank=True))
+
+    def validate_emails(self, value):
+        return check_batch_size(value)
+
+
 class UserUpdateSerializer(serializers.ModelSerializer):
     user_id = serializers.IntegerField(required=False)
     team_id = serializers.IntegerField(required=False)
@@ -0,0 +1,72 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from common.availability import create_lower_index
+from common.models import CommonParameters
+from teams.models import Agency, DataSource, Team
+from users.effective_settings import invalidate_effective_settings, settings_cache
+from users.member_counts import apply_member_change, recount_members, snapshot
+from users.models import User
+from users.search import user_search
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, instance, **kwargs):
+    invalidate_effective_settings(('user', instance.pk))
+
+
+@receiver(post_init, sender=User)
+def user_loaded(sender, instance, **kwargs):
+    instance._member_snapshot = snapshot(instance) if instance.pk is not None else None
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    user_search.index(instance)
+    current = snapshot(instance)
+    previous = getattr(instance, '_member_snapshot', None)
+    if not created and previous is None:
+        # Loaded with deferred fields, so the previous groups are unknown.
+        recount_members([instance.team_id], [instance.agency_id])
+    else:
+        apply_member_change(None if created else previous, current)
+    instance._member_snapshot = current
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    user_search.remove(instance.pk)
+    apply_member_change(getattr(instance, '_member_snapshot', None), None)
+
+
+@receiver([post_save, post_delete], sender=Team)
+def team_changed(sender, instance, **kwargs):
+    invalidate_effective_settings(('team', instance.pk))
+
+
+@receiver(post_delete, sender=Team)
+def team_deleted(sender, instance, **kwargs):
+    # Members are detached with a queryset update (SET_NULL), which sends no signals.
+    user_search.move_team(instance.pk, None)
+
+
+@receiver([post_save, post_delete], sender=Agency)
+def agency_changed(sender, instance, **kwargs):
+    invalidate_effective_settings(('agency', instance.pk))
+
+
+@receiver([post_save, post_delete], sender=CommonParameters)
+def common_parameters_changed(sender, instance, **kwargs):
+    invalidate_effective_settings(('common_parameters', instance.pk))
+
+
+@receiver([post_save, post_delete], sender=DataSource)
+def data_source_changed(sender, instance, **kwargs):
+    # The previous agency of a moved data source is unknown here, so drop everything.
+    settings_cache.clear()
+
+
+def create_availability_indexes(using, **kwargs):
+    # The columns the availability checks and bulk provisioning compare case-insensitively.
+    create_lower_index(User, 'email', using)
+    create_lower_index(Team, 'name', using)
@@ -0,0 +1,451 @@
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from common.models import CommonParameters
+from common.pagination import Pagination, decode_cursor
+from common.sorting import Sort
+from teams.models import Agency, Team
+from users import imports
+from users.effective_settings import load_effective_settings
+from users.imports import cancel_job, claim_job, process_next_job, run_job
+from users.member_counts import recount_members, shift_active_members
+from users.models import RevokedToken, User, UserImportJob
+from users.provisioning import CREATED, DUPLICATE, INVALID, provision_users
+from users.revocation import RevocationList
+from users.search import DatabaseUserSearchBackend, TrigramUserSearchBackend, user_search
+
+
+def make_user(username, **fields):
+    fields.setdefault('email', '%s@example.com' % username)
+    fields.setdefault('password', '!')
+    return User.objects.create(username=username, first_name=username, last_name=username, **fields)
+
+
+class ProvisionUsersTests(TestCase):
+
+    def setUp(self):
+        parameters = CommonParameters.objects.create(currency='EUR', date_type='UK')
+        self.agency = Agency.objects.create(name='Acme', common_parameters=parameters)
+        self.team = Team.objects.create(name='Blue', agency=self.agency)
+        make_user('taken', email='Taken@Example.com', agency=self.agency)
+
+    def test_rows_are_classified(self):
+        results = provision_users(
+            ['new@example.com', 'bad', None, '', 'NEW@example.com', 'taken@example.com', ' other@example.com '],
+            self.agency, self.team, password='!'
+        )
+
+        self.assertEqual(results, [
+            {'email': 'new@example.com', 'status': CREATED},
+            {'email': 'bad', 'status': INVALID},
+            {'email': '', 'status': INVALID},
+            {'email': '', 'status': INVALID},
+            {'email': 'NEW@example.com', 'status': DUPLICATE},
+            {'email': 'taken@example.com', 'status': DUPLICATE},
+            {'email': 'other@example.com', 'status': CREATED},
+        ])
+        created = User.objects.filter(email__in=['new@example.com', 'other@example.com'])
+        self.assertEqual(created.count(), 2)
+        self.assertTrue(all(user.team_id == self.team.id and user.is_agent for user in created))
+        # Users get no parameters row of their own and inherit the agency's.
+        self.assertTrue(all(user.common_parameters_id is None for user in created))
+        self.assertEqual(load_effective_settings(created[0].pk)[0]['currency'], 'EUR')
+
+    def test_counters_follow_bulk_insert(self):
+        provision_users(['a@example.com', 'b@example.com'], self.agency, self.team, password='!', is_active=False)
+
+        self.team.refresh_from_db()
+        self.agency.refresh_from_db()
+        self.assertEqual((self.team.member_count, self.team.active_member_count), (2, 0))
+        self.assertEqual((self.agency.member_count, self.agency.active_member_count), (3, 1))
+
+
+class MemberCountTests(TestCase):
+
+    def setUp(self):
+        self.agency = Agency.objects.create(name='Acme')
+        self.blue = Team.objects.create(name='Blue', agency=self.agency)
+        self.red = Team.objects.create(name='Red', agency=self.agency)
+
+    def counts(self, group):
+        group.refresh_from_db()
+        return group.member_count, group.active_member_count
+
+    def test_saves_and_deletes_apply_deltas(self):
+        user = make_user('ann', agency=self.agency, team=self.blue)
+        make_user('bob', agency=self.agency, team=self.blue, is_active=False)
+        self.assertEqual(self.counts(self.blue), (2, 1))
+        self.assertEqual(self.counts(self.agency), (2, 1))
+
+        user.team = self.red
+        user.save()
+        self.assertEqual(self.counts(self.blue), (1, 0))
+        self.assertEqual(self.counts(self.red), (1, 1))
+
+        user.is_active = False
+        user.save()
+        self.assertEqual(self.counts(self.red), (1, 0))
+        self.assertEqual(self.counts(self.agency), (2, 0))
+
+        user.delete()
+        self.assertEqual(self.counts(self.red), (0, 0))
+        self.assertEqual(self.counts(self.agency), (1, 0))
+
+    def test_saving_a_deferred_instance_recounts(self):
+        make_user('ann', agency=self.agency, team=self.blue)
+        user = User.objects.only('id', 'username').get(username='ann')
+        User.objects.filter(pk=user.pk).update(team=self.red)
+        user.save()
+        self.assertEqual(self.counts(self.red), (1, 1))
+
+    def test_shift_active_members(self):
+        make_user('ann', agency=self.agency, team=self.blue)
+        make_user('bob', agency=self.agency, team=self.red)
+        shift_active_members([(self.blue.id, self.agency.id), (self.red.id, self.agency.id)], -1)
+        self.assertEqual(self.counts(self.blue), (1, 0))
+        self.assertEqual(self.counts(self.agency), (2, 0))
+
+    def test_recount_repairs_drift(self):
+        make_user('ann', agency=self.agency, team=self.blue)
+        Team.objects.filter(pk=self.blue.pk).update(member_count=9, active_member_count=9)
+        recount_members([self.blue.id], [self.agency.id])
+        self.assertEqual(self.counts(self.blue), (1, 1))
+
+
+class RevocationListTests(TestCase):
+
+    def setUp(self):
+        self.agency = Agency.objects.create(name='Acme')
+        self.user = make_user('ann', agency=self.agency)
+        self.revocations = RevocationList(30)
+
+    def token(self, issued_at=None):
+        token = RefreshToken.for_user(self.user)
+        token['agency_id'] = self.agency.id
+        token['team_id'] = None
+        if issued_at is not None:
+            token['iat'] = issued_at
+        return token
+
+    def test_single_token(self):
+        token, other = self.token(), self.token()
+        self.revocations.revoke_token(token)
+        self.assertTrue(self.revocations.is_revoked(token))
+        self.assertFalse(self.revocations.is_revoked(other))
+
+    def test_user_and_agency_revocations_cover_older_tokens_only(self):
+        before = self.token(time.time() - 1)
+        self.revocations.revoke_user(self.user.id)
+        after = self.token(time.time())
+        self.assertTrue(self.revocations.is_revoked(before))
+        self.assertFalse(self.revocations.is_revoked(after))
+
+        self.revocations.revoke_agency(self.agency.id)
+        self.assertTrue(self.revocations.is_revoked(after))
+
+    def test_token_without_iat_falls_back_to_expiry(self):
+        token = self.token()
+        self.assertNotIn('iat', token)
+        self.revocations.revoke_user(self.user.id)
+        self.assertTrue(self.revocations.is_revoked(token))
+
+    def test_rebuild_reads_revocations_of_other_workers(self):
+        token = self.token(time.time() - 1)
+        self.assertFalse(self.revocations.is_revoked(token))
+        RevocationList(30).revoke_user(self.user.id)
+        self.assertFalse(self.revocations.is_revoked(token))
+        self.revocations.rebuild()
+        self.assertTrue(self.revocations.is_revoked(token))
+
+    def test_expired_rows_are_not_loaded(self):
+        token = self.token(time.time() - 1)
+        RevokedToken.objects.create(key='user:%d' % self.user.id, revoked_at=timezone.now(),
+                                    expires_at=timezone.now() - timedelta(seconds=1))
+        self.revocations.rebuild()
+        self.assertFalse(self.revocations.is_revoked(token))
+
+
+class KeysetPagingTests(TestCase):
+
+    def setUp(self):
+        self.agency = Agency.objects.create(name='Acme')
+        now = timezone.now()
+        # Repeated and missing values exercise the id tie-breaker and the NULL placement.
+        logins = [None, now, now - timedelta(days=1), None, now, now - timedelta(days=2), now, None]
+        for index, last_login in enumerate(logins):
+            make_user('user%d' % index, agency=self.agency, last_login=last_login)
+        self.sort = Sort('last_login', model=User)
+
+    def expected(self, descending):
+        rows = User.objects.values_list('id', 'last_login')
+        return [pk for pk, value in sorted(rows, key=lambda row: self.sort.key(row[1], row[0]), reverse=descending)]
+
+    def test_after_walks_every_row_once(self):
+        for descending in (False, True):
+            seen, bound = [], None
+            while True:
+                users = User.objects.all()
+                if bound is not None:
+                    users = users.filter(self.sort.after(bound[0], bound[1], descending))
+                rows = list(users.order_by(*self.sort.ordering(descending)).values_list('id', 'last_login')[:3])
+                if not rows:
+                    break
+                seen.extend(pk for pk, value in rows)
+                bound = rows[-1][1], rows[-1][0]
+            self.assertEqual(seen, self.expected(descending))
+
+    def walk(self, backend, sort):
+        factory = RequestFactory()
+        params = {'paging': 'cursor', 'per_page': 3}
+        forward, cursors = [], []
+        while True:
+            paging = Pagination(factory.get('/', params), sort=sort)
+            forward.extend(paging.paginate_search(backend, '', ('agency', self.agency.id)))
+            cursors.append(paging.prev)
+            if paging.next is None:
+                break
+            params['cursor'] = paging.next
+
+        backward = []
+        for cursor in reversed(cursors[1:]):
+            paging = Pagination(factory.get('/', {'paging': 'cursor', 'per_page': 3, 'cursor': cursor}), sort=sort)
+            self.assertEqual(decode_cursor(cursor, sort)[0], 'prev')
+            backward = paging.paginate_search(backend, '', ('agency', self.agency.id)) + backward
+        return forward, backward
+
+    def test_cursors_page_both_ways_on_both_backends(self):
+        for backend in (DatabaseUserSearchBackend(), TrigramUserSearchBackend(300)):
+            for descending in (False, True):
+                sort = Sort('last_login', descending, User)
+                forward, backward = self.walk(backend, sort)
+                expected = self.expected(descending)
+                self.assertEqual(forward, expected)
+                # Walking the prev cursors back from the last page covers all but the first page.
+                self.assertEqual(backward, expected[:len(backward)])
+
+
+class TrigramIndexTests(TestCase):
+
+    def setUp(self):
+        self.agency = Agency.objects.create(name='Acme')
+        self.team = Team.objects.create(name='Blue', agency=self.agency)
+        self.ann = make_user('annabel', email='ann@acme.com', agency=self.agency, team=self.team)
+        self.bob = make_user('bob', email='bob@acme.com', agency=self.agency)
+        self.eve = make_user('eve', email='Eve.Annis@other.com')
+        self.backend = TrigramUserSearchBackend(300)
+
+    def search(self, *args):
+        rows, total = self.backend.search(*args)
+        return [pk for pk, value in rows], total
+
+    def test_matches_substrings_of_any_field_newest_first(self):
+        self.assertEqual(self.search('ANN'), ([self.eve.pk, self.ann.pk], 2))
+        self.assertEqual(self.search('acme.c'), ([self.bob.pk, self.ann.pk], 2))
+        # Shorter than a trigram: falls back to scanning the stored values.
+        self.assertEqual(self.search('bo'), ([self.bob.pk], 1))
+        self.assertEqual(self.search('nobody'), ([], 0))
+
+    def test_scope_offset_and_limit(self):
+        self.assertEqual(self.search('', ('agency', self.agency.id), 0, 1), ([self.bob.pk], 2))
+        self.assertEqual(self.search('', ('agency', self.agency.id), 1, 1), ([self.ann.pk], 2))
+        self.assertEqual(self.search('ann', ('team', self.team.id)), ([self.ann.pk], 1))
+
+    def test_writes_and_inserts_from_other_workers(self):
+        self.backend.search('')
+        self.bob.username = 'robert'
+        self.backend.index(self.bob)
+        self.backend.remove(self.eve.pk)
+        # Rows this backend never saw a signal for are caught up by id.
+        carl = make_user('carl', agency=self.agency)
+
+        self.assertEqual(self.search('robert')[0], [self.bob.pk])
+        self.assertEqual(self.search('ann')[0], [self.ann.pk])
+        self.assertEqual(self.search('carl')[0], [carl.pk])
+
+    def test_move_team(self):
+        self.backend.search('')
+        self.backend.move_team(self.team.id, None)
+        self.assertEqual(self.search('', ('team', self.team.id)), ([], 0))
+
+    def test_remove_during_rebuild_survives_the_swap(self):
+        self.backend.search('')
+        rows = self.backend._rows
+
+        def racing_rows(users):
+            for row in rows(users):
+                # A delete signal lands after the rebuild already read the row.
+                self.backend.remove(self.ann.pk)
+                yield row
+
+        with mock.patch.object(self.backend, '_rows', racing_rows):
+            self.backend.rebuild()
+        self.assertEqual(self.search('annabel')[0], [])
+        self.assertIsNone(self.backend._pending)
+
+    def test_refresh_drops_deleted_users(self):
+        self.backend.search('')
+        User.objects.filter(pk=self.eve.pk).delete()
+        self.backend.refresh(self.eve.pk)
+        self.assertEqual(self.search('eve')[0], [])
+
+    def test_refresh_picks_up_queryset_updates(self):
+        self.backend.search('')
+        User.objects.filter(pk=self.bob.pk).update(team=self.team)
+        self.assertEqual(self.search('', ('team', self.team.id))[0], [self.ann.pk])
+        self.backend.refresh(self.bob.pk)
+        self.assertEqual(self.search('', ('team', self.team.id))[0], [self.bob.pk, self.ann.pk])
+
+
+class ImportJobTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.media = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.media.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.agency = Agency.objects.create(name='Acme')
+        make_user('taken', agency=self.agency)
+
+    def create_job(self, content, name='users.csv', **fields):
+        return UserImportJob.objects.create(
+            agency=self.agency, source=SimpleUploadedFile(name, content.encode()), password='!',
+            file_format=imports.import_format(name), **fields
+        )
+
+    def test_claim_skips_live_jobs_and_reclaims_stale_ones(self):
+        live = self.create_job('a@example.com\n', status=UserImportJob.RUNNING, worker='w1',
+                               heartbeat_at=timezone.now())
+        stale = self.create_job('b@example.com\n', status=UserImportJob.RUNNING, worker='w1',
+                                heartbeat_at=timezone.now() - timedelta(seconds=120),
+                                started_at=timezone.now() - timedelta(seconds=300))
+        started_at = stale.started_at
+
+        with override_settings(USER_IMPORT_STALE_AFTER=60):
+            job = claim_job('w2')
+            self.assertEqual(job.pk, stale.pk)
+            self.assertEqual((job.status, job.worker, job.started_at), (UserImportJob.RUNNING, 'w2', started_at))
+            self.assertIsNone(claim_job('w3'))
+        live.refresh_from_db()
+        self.assertEqual(live.worker, 'w1')
+
+    def test_csv_job_reports_duplicates_and_invalid_rows(self):
+        job = self.create_job('Name,Email\nx,one@example.com\n\nx,bad\nx,TAKEN@example.com\nx,two@example.com\n')
+
+        self.assertEqual(process_next_job('w1', chunk_size=2).pk, job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, UserImportJob.DONE)
+        self.assertEqual((job.total_rows, job.processed_rows), (4, 4))
+        self.assertEqual((job.created_count, job.duplicate_count, job.invalid_count), (2, 1, 1))
+        self.assertEqual(list(job.errors.order_by('row_number').values_list('row_number', 'email', 'status')),
+                         [(2, 'bad', INVALID), (3, 'TAKEN@example.com', DUPLICATE)])
+
+    def test_crashed_job_resumes_without_repeating_rows(self):
+        job = self.create_job('\n'.join(['{"email": "u%d@example.com"}' % i for i in range(5)] + ['{bad']),
+                              name='users.ndjson')
+        provision = imports.provision_users
+        calls = []
+
+        def crash_on_second_chunk(*args, **kwargs):
+            calls.append(args)
+            results = provision(*args, **kwargs)
+            if len(calls) == 2:
+                raise RuntimeError('worker died')
+            return results
+
+        job = claim_job('w1')
+        with mock.patch('users.imports.provision_users', crash_on_second_chunk):
+            with self.assertRaises(RuntimeError):
+                run_job(job, chunk_size=2)
+        job.refresh_from_db()
+        self.assertEqual(job.processed_rows, 2)
+        self.assertEqual(User.objects.filter(email__startswith='u').count(), 2)
+
+        with override_settings(USER_IMPORT_STALE_AFTER=-1):
+            process_next_job('w2', chunk_size=2)
+        job.refresh_from_db()
+        self.assertEqual(job.status, UserImportJob.DONE)
+        self.assertEqual((job.processed_rows, job.created_count, job.invalid_count), (6, 5, 1))
+        self.assertEqual(list(job.errors.values_list('row_number', flat=True)), [6])
+
+    def test_cancel_rolls_back_the_chunk_in_flight(self):
+        job = self.create_job('\n'.join('u%d@example.com' % i for i in range(4)) + '\nbad\n')
+        read = imports.iter_emails
+        passes = []
+
+        def cancel_while_reading_second_chunk(job):
+            passes.append(job)
+            for number, email in enumerate(read(job), 1):
+                if len(passes) == 2 and number == 4:
+                    # Committed by the API process while the worker holds rows 4-5.
+                    self.assertTrue(cancel_job(job))
+                yield email
+
+        with mock.patch('users.imports.iter_emails', cancel_while_reading_second_chunk):
+            process_next_job('w1', chunk_size=3)
+        job.refresh_from_db()
+        self.assertEqual(job.status, UserImportJob.CANCELLED)
+        self.assertEqual((job.processed_rows, job.created_count), (3, 3))
+        self.assertEqual(User.objects.filter(email__startswith='u').count(), 3)
+        self.assertFalse(job.errors.exists())
+        self.assertIsNone(claim_job('w2'))
+
+
+class SearchViewTests(TestCase):
+
+    def setUp(self):
+        self.agency = Agency.objects.create(name='Acme')
+        self.other = Agency.objects.create(name='Other')
+        self.admin = make_user('admin', agency=self.agency, is_agency_admin=True)
+        self.ann = make_user('ann', agency=self.agency)
+        # The process-wide index outlives the rolled-back test transaction.
+        user_search.rebuild()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def search(self, keyword):
+        response = self.client.get('/api/v1/users/search/', {'keyword': keyword, 'per_page': 10})
+        return [user['user_id'] for user in response.json()['data']['users']]
+
+    def test_user_moved_to_another_agency_is_not_served(self):
+        self.assertEqual(self.search('ann'), [self.ann.pk])
+        # A move by another worker: no signal reaches this process's index.
+        User.objects.filter(pk=self.ann.pk).update(agency=self.other)
+        self.assertEqual(self.search('ann'), [])
+
+
+class EmailBatchCheckViewTests(TestCase):
+    url = '/api/v1/users/email-check/batch/'
+
+    def setUp(self):
+        make_user('ann')
+        self.client = APIClient()
+
+    def check(self, user=None):
+        self.client.force_authenticate(user)
+        return self.client.post(self.url, {'emails': ['ann@example.com', 'bob@example.com']}, format='json')
+
+    def test_anonymous_requests_and_agents_are_rejected(self):
+        self.assertIn(self.check().status_code, (401, 403))
+        self.assertEqual(self.check(make_user('agent', is_agent=True)).status_code, 403)
+
+    def test_team_leads_can_check(self):
+        response = self.check(make_user('lead', is_team_lead=True))
+        self.assertEqual(response.json()['data']['available'], {'ann@example.com': False, 'bob@example.com': True})
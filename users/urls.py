@@ -1,6 +1,8 @@
 from django.urls import path
 from .views import BasicInfoView, UserDetailView, SearchDetailView, AddUserView, AllUsersListView, BulkAddUserView,\
-    EmailCheckView, UserUpdateView, UserAchieveView, AvailableUsersListView, GeneralInfoView, AvailableAdminListView
+    EmailCheckView, UserUpdateView, UserAchieveView, AvailableUsersListView, GeneralInfoView, AvailableAdminListView, \
+    UserExportView, UserImportView, UserImportDetailView, UserImportCancelView, UserImportErrorsView, \
+    EmailBatchCheckView
 
 app_name = 'users'
 
@@ -8,12 +10,18 @@ urlpatterns = [
     path('basic/', BasicInfoView.as_view()),
     path('general/', GeneralInfoView.as_view()),
     path('search/', SearchDetailView.as_view()),
+    path('export/', UserExportView.as_view()),
     path('list/', AllUsersListView.as_view()),
     path('list/<int:pk>/', AvailableUsersListView.as_view()),
     path('list/agency/<int:pk>/', AvailableAdminListView.as_view()),
     path('single-add/', AddUserView.as_view()),
     path('bulk-add/', BulkAddUserView.as_view()),
+    path('imports/', UserImportView.as_view()),
+    path('imports/<int:pk>/', UserImportDetailView.as_view()),
+    path('imports/<int:pk>/cancel/', UserImportCancelView.as_view()),
+    path('imports/<int:pk>/errors/', UserImportErrorsView.as_view()),
     path('email-check/', EmailCheckView.as_view()),
+    path('email-check/batch/', EmailBatchCheckView.as_view()),
 
     path('<int:pk>/', UserDetailView.as_view()),
     path('update/', UserUpdateView.as_view()),
@@ -1,16 +1,43 @@
 from django.core.exceptions import ObjectDoesNotExist
 from rest_framework.generics import GenericAPIView
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from rest_framework.response import Response
 from rest_framework import status
-from django.db.models import Q
+from django.db.models import F, Q
+from django.http import StreamingHttpResponse
 
 from teams.models import Team, Agency
-from users.models import User
+from users.effective_settings import get_effective_settings
+from users.imports import cancel_job, import_format, serialize_job
+from users.models import User, UserImportJob
+from users.provisioning import provision_users
+from users.revocation import revocation_list
+from users.search import user_search
 from common.models import CommonParameters
-from common.serializers import IsSuperUser, IsAgencyAdmin, IsTeamLead, serialize_user
+from common.authentication import invalidate_user_credentials
+from api.claims import bump_claims_version
+from common.availability import availability
+from common.counting import EXACT
+from common.export import EXPORT_CHUNK_SIZE, export_response, json_list_response, stream_csv
+from common.pagination import Pagination
+from common.sorting import resolve_sort
+from common.serializers import IsSuperUser, IsAgencyAdmin, IsTeamLead, serialize_user, USER_PLAN
 from .serializers import GetUserByIdSerializer, SingleAddUserSerializer, BulkAddUserSerializer, UserUpdateSerializer,\
-    BasicInfoSerializer, GeneralInfoSerializer
+    BasicInfoSerializer, GeneralInfoSerializer, UserImportSerializer, \
+    EmailBatchCheckSerializer
+
+SEARCH_USER_PLAN = USER_PLAN.extend(
+    ('email', 'email'),
+    ('phone_number', 'phone_number'),
+    ('agency_id', 'agency_id'),
+    ('agency_name', 'agency__name'),
+    ('team_id', 'team_id'),
+    ('team_name', 'team__name'),
+    ('is_active', 'is_active'),
+)
+USER_EXPORT_FIELDS = (
+    'id', 'email', 'username', 'first_name', 'last_name', 'phone_number', 'agency_id', 'agency_name', 'team_id',
+    'team_name', 'is_active', 'is_agent', 'is_team_lead', 'is_agency_admin'
+)
 
 
 class BasicInfoView(GenericAPIView):
@@ -18,7 +45,7 @@ class BasicInfoView(GenericAPIView):
 
     def get(self, request):
         user = request.user
-        common_parameter = user.common_parameters
+        effective = get_effective_settings(user.id)
         return Response(
             {
                 "result": True,
@@ -28,8 +55,8 @@ class BasicInfoView(GenericAPIView):
                         "last_name": user.last_name,
                         "phone_number": user.phone_number,
                         "email_address": user.email,
-                        "currency": common_parameter.currency,
-                        "date_type": common_parameter.date_type
+                        "currency": effective['currency'],
+                        "date_type": effective['date_type']
                     }
                 }
             }
@@ -49,10 +76,15 @@ class BasicInfoView(GenericAPIView):
         user.last_name = last_name
         user.phone_number = phone_number
         user.email = email_address
+        # Copy on write: a user who inherited until now gets an override row with just these fields.
+        parameters = user.common_parameters or CommonParameters()
+        parameters.currency = currency
+        parameters.date_type = date_type
+        parameters.save()
+        user.common_parameters = parameters
         user.save()
-        user.common_parameters.currency = currency
-        user.common_parameters.date_type = date_type
-        user.common_parameters.save()
+        invalidate_user_credentials(user.id)
+        bump_claims_version(user.agency_id)
 
         return Response(
             {
@@ -63,8 +95,8 @@ class BasicInfoView(GenericAPIView):
                         "last_name": user.last_name,
                         "phone_number": user.phone_number,
                         "email_address": user.email,
-                        "currency": user.common_parameters.currency,
-                        "date_type": user.common_parameters.date_type
+                        "currency": parameters.currency,
+                        "date_type": parameters.date_type
                     }
                 }
             }
@@ -111,6 +143,7 @@ class GeneralInfoView(GenericAPIView):
         agency.common_parameters.currency = currency
         agency.common_parameters.date_type = date_type
         agency.common_parameters.save()
+        bump_claims_version(agency.id)
 
         return Response(
             {
@@ -160,6 +193,7 @@ class UserDetailView(GenericAPIView):
     def delete(self, request, pk):
         try:
             User.objects.get(id=pk).delete()
+            invalidate_user_credentials(pk)
 
             return Response(
                 {
@@ -182,97 +216,64 @@ class UserDetailView(GenericAPIView):
 
 class SearchDetailView(GenericAPIView):
     permission_classes = IsTeamLead,
+    count_mode = EXACT
+    sort_fields = {
+        'name': 'username',
+        'email': 'email',
+        'last_login': 'last_login',
+        'created_at': 'created_at',
+        'is_active': 'is_active',
+    }
 
     def get(self, request):
         keyword = request.GET.get('keyword')
-        page = request.GET.get('page')
-        number_per_page = request.GET.get('per_page')
-        sort_by = request.GET.get('sort_by')
-        sort_order = request.GET.get('sort_order')
-        sea_users = []
+        sort = resolve_sort(request, User, self.sort_fields)
         if request.user.is_superuser:
-            if keyword:
-                allusers = User.objects.filter(username__icontains=keyword).order_by('-id')
-                number_of_active_users = User.objects.filter(username__icontains=keyword).count()
-            else:
-                allusers = User.objects.all().order_by('-id').order_by('-id')
-                number_of_active_users = User.objects.all().count()
-            paginator = Paginator(allusers, number_per_page)
-            try:
-                search = paginator.page(page)
-            except PageNotAnInteger:
-                search = paginator.page(1)
-            except EmptyPage:
-                search = []
-
+            scope = None
         elif request.user.is_agency_admin:
-            agency = request.user.agency
-            if keyword:
-                allusers = User.objects.filter(agency=agency, username__icontains=keyword).order_by('-id')
-                number_of_active_users = User.objects.filter(agency=agency, username__icontains=keyword).count()
-            else:
-                allusers = User.objects.filter(agency=agency).order_by('-id').order_by('-id')
-                number_of_active_users = User.objects.filter(agency=agency).count()
-            paginator = Paginator(allusers, number_per_page)
-            try:
-                search = paginator.page(page)
-            except PageNotAnInteger:
-                search = paginator.page(1)
-            except EmptyPage:
-                search = []
-
+            scope = ('agency', request.user.agency_id)
         else:
-            team = request.user.team
-            if keyword:
-                allusers = User.objects.filter(team=team, username__icontains=keyword).order_by('-id')
-                number_of_active_users = User.objects.filter(team=team, username__icontains=keyword).count()
-            else:
-                allusers = User.objects.filter(team=team).order_by('-id').order_by('-id')
-                number_of_active_users = User.objects.filter(team=team).count()
-            paginator = Paginator(allusers, number_per_page)
-            try:
-                search = paginator.page(page)
-            except PageNotAnInteger:
-                search = paginator.page(1)
-            except EmptyPage:
-                search = []
-
-        for sea in search:
-            if sea.team is None:
-                team_name = None
-                team_id = None
-            else:
-                team_name = sea.team.name
-                team_id = sea.team.id
-            if sea.agency is None:
-                agency_name = None
-                agency_id = None
-            else:
-                agency_name = sea.agency.name
-                agency_id = sea.agency.id
-            sea_users.append({
-                **serialize_user(sea),
-                "email": sea.email,
-                "phone_number": sea.phone_number,
-                "agency_id": agency_id,
-                "agency_name": agency_name,
-                "team_id": team_id,
-                "team_name": team_name,
-                "is_active": sea.is_active,
-                "role": "Team Lead"
-            })
+            scope = ('team', request.user.team_id)
+
+        pagination = Pagination(request, self.count_mode, sort)
+        ids = pagination.paginate_search(user_search, keyword, scope)
+        number_of_active_users = pagination.count
+        users = User.objects.all()
+        if scope is not None:
+            # The index may lag a move made by another worker; never serialize outside the scope.
+            users = users.filter(**{scope[0]: scope[1]})
+        sea_users = SEARCH_USER_PLAN.serialize_ids(users, ids)
+        for sea in sea_users:
+            sea["role"] = "Team Lead"
+
         return Response(
             {
                 "result": True,
                 "data": {
                     "number_of_users": number_of_active_users,
-                    "users": sea_users
+                    "users": sea_users,
+                    **pagination.meta()
                 }
             },
             status=status.HTTP_201_CREATED
         )
 
 
+class UserExportView(GenericAPIView):
+    permission_classes = IsTeamLead,
+
+    def get(self, request):
+        users = User.objects.all()
+        if request.user.is_superuser:
+            pass
+        elif request.user.is_agency_admin:
+            users = users.filter(agency_id=request.user.agency_id)
+        else:
+            users = users.filter(team_id=request.user.team_id)
+        users = users.annotate(agency_name=F('agency__name'), team_name=F('team__name'))
+        return export_response(request, users, USER_EXPORT_FIELDS, 'users')
+
+
 class AddUserView(GenericAPIView):
     permission_classes = IsTeamLead,
     serializer_class = SingleAddUserSerializer
@@ -290,16 +291,7 @@ class AddUserView(GenericAPIView):
         user.is_active = serializer.data.get('is_active')
         if request.user.is_agency_admin:
             agency = request.user.agency
-            common_parameter = agency.common_parameters
-            common_parameters = CommonParameters()
-            common_parameters.currency = common_parameter.currency
-            common_parameters.date_type = common_parameter.date_type
-            common_parameters.booking_enabled = common_parameter.booking_enabled
-            common_parameters.virtual_interlining = common_parameter.virtual_interlining
-            common_parameters.exclude_carriers = common_parameter.exclude_carriers
-            common_parameters.save()
             user.agency = agency
-            user.common_parameters = common_parameters
             if serializer.data.get('team_id'):
                 try:
                     team = Team.objects.get(id=serializer.data.get('team_id'))
@@ -317,35 +309,19 @@ class AddUserView(GenericAPIView):
             else:
                 user.is_agent = True
             user.save()
+            invalidate_user_credentials(user.id)
         elif request.user.is_team_lead:
             team = request.user.team
             user.team = team
-            common_parameter = team.agency.common_parameters
-            common_parameters = CommonParameters()
-            common_parameters.currency = common_parameter.currency
-            common_parameters.date_type = common_parameter.date_type
-            common_parameters.booking_enabled = common_parameter.booking_enabled
-            common_parameters.virtual_interlining = common_parameter.virtual_interlining
-            common_parameters.exclude_carriers = common_parameter.exclude_carriers
-            common_parameters.save()
-            user.common_parameters = common_parameters
             user.agency = team.agency
             user.is_agent = False
             user.save()
+            invalidate_user_credentials(user.id)
         else:
             if serializer.data.get('agency_id'):
                 try:
                     agency = Agency.objects.get(id=serializer.data.get('agency_id'))
                     user.agency = agency
-                    common_parameter = agency.common_parameters
-                    common_parameters = CommonParameters()
-                    common_parameters.currency = common_parameter.currency
-                    common_parameters.date_type = common_parameter.date_type
-                    common_parameters.booking_enabled = common_parameter.booking_enabled
-                    common_parameters.virtual_interlining = common_parameter.virtual_interlining
-                    common_parameters.exclude_carriers = common_parameter.exclude_carriers
-                    common_parameters.save()
-                    user.common_parameters = common_parameters
                     user.is_agent = False
                 except ObjectDoesNotExist:
                     return Response(
@@ -373,6 +349,7 @@ class AddUserView(GenericAPIView):
             else:
                 user.is_agent = True
             user.save()
+            invalidate_user_credentials(user.id)
 
         return Response(
             {
@@ -389,20 +366,8 @@ class AllUsersListView(GenericAPIView):
 
     def get(self, request):
         user_list = User.objects.filter(is_agent=True)
-        user_detail = []
-        for user in user_list:
-            user_detail.append({
-                **serialize_user(user)
-            })
-        return Response(
-            {
-                "result": True,
-                "data": {
-                    "users": user_detail
-                }
-            },
-            status=status.HTTP_201_CREATED
-        )
+        rows = USER_PLAN.iterate(user_list, EXPORT_CHUNK_SIZE)
+        return json_list_response('users', rows, status_code=status.HTTP_201_CREATED)
 
 
 class AvailableUsersListView(GenericAPIView):
@@ -411,20 +376,8 @@ class AvailableUsersListView(GenericAPIView):
     def get(self, request, pk):
         team = Team.objects.get(id=pk)
         user_list = User.objects.filter(Q(is_agent=True) | Q(team=team))
-        user_detail = []
-        for user in user_list:
-            user_detail.append({
-                **serialize_user(user)
-            })
-        return Response(
-            {
-                "result": True,
-                "data": {
-                    "users": user_detail
-                }
-            },
-            status=status.HTTP_201_CREATED
-        )
+        rows = USER_PLAN.iterate(user_list, EXPORT_CHUNK_SIZE)
+        return json_list_response('users', rows, status_code=status.HTTP_201_CREATED)
 
 
 class AvailableAdminListView(GenericAPIView):
@@ -433,193 +386,154 @@ class AvailableAdminListView(GenericAPIView):
     def get(self, request, pk):
         agency = Agency.objects.get(id=pk)
         user_list = User.objects.filter(Q(is_agent=True) | Q(agency=agency))
-        user_detail = []
-        for user in user_list:
-            user_detail.append({
-                **serialize_user(user)
-            })
+        rows = USER_PLAN.iterate(user_list, EXPORT_CHUNK_SIZE)
+        return json_list_response('users', rows, status_code=status.HTTP_201_CREATED)
+
+
+def bulk_target(user, agency_id, team_id):
+    """Return ``(agency, team, error_msg)`` for a bulk add or import requested by ``user``."""
+    team = None
+    if user.is_agency_admin:
+        agency = user.agency
+    elif user.is_team_lead:
+        # Team leads always add to their own team.
+        team, team_id = user.team, None
+        agency = team.agency
+    else:
+        try:
+            agency = Agency.objects.select_related('common_parameters').get(id=agency_id)
+        except ObjectDoesNotExist:
+            return None, None, "agency_id is invalid."
+    if team_id:
+        try:
+            team = Team.objects.get(id=team_id)
+        except ObjectDoesNotExist:
+            return None, None, "team_id is invalid."
+    return agency, team, None
+
+
+class BulkAddUserView(GenericAPIView):
+    permission_classes = IsTeamLead,
+    serializer_class = BulkAddUserSerializer
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        agency, team, error = bulk_target(request.user, serializer.data.get('agency_id'),
+                                          serializer.data.get('team_id'))
+        if error:
+            return Response(
+                {
+                    "result": False,
+                    "data": {
+                        "msg": error
+                    },
+                },
+            )
+
+        results = provision_users(serializer.data.get('emails') or [], agency, team, serializer.data.get('password'),
+                                  serializer.data.get('is_active'))
         return Response(
             {
                 "result": True,
                 "data": {
-                    "users": user_detail
-                }
+                    "msg": "Bulk Users created.",
+                    "users": results
+                },
             },
-            status=status.HTTP_201_CREATED
         )
 
 
-class BulkAddUserView(GenericAPIView):
+class UserImportView(GenericAPIView):
     permission_classes = IsTeamLead,
-    serializer_class = BulkAddUserSerializer
+    serializer_class = UserImportSerializer
 
     def post(self, request):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        emails = serializer.data.get('emails')
-        password = None
-        if serializer.data.get('password'):
-            password = serializer.data.get('password')
-        if request.user.is_agency_admin:
-            agency = request.user.agency
-            common_parameter = agency.common_parameters
-            if serializer.data.get('team_id'):
-                try:
-                    team = Team.objects.get(id=serializer.data.get('team_id'))
-                    if emails:
-                        for email in emails:
-                            user = User()
-                            user.email = email
-                            user.username = email
-                            user.first_name = email
-                            user.last_name = email
-                            user.team = team
-                            user.agency = agency
-                            user.password = password
-                            user.is_active = serializer.data.get('is_active')
-                            user.is_agent = True
-                            common_parameters = CommonParameters()
-                            common_parameters.currency = common_parameter.currency
-                            common_parameters.date_type = common_parameter.date_type
-                            common_parameters.booking_enabled = common_parameter.booking_enabled
-                            common_parameters.virtual_interlining = common_parameter.virtual_interlining
-                            common_parameters.exclude_carriers = common_parameter.exclude_carriers
-                            common_parameters.save()
-                            user.common_parameters = common_parameters
-                            user.save()
-                except ObjectDoesNotExist:
-                    return Response(
-                        {
-                            "result": False,
-                            "data": {
-                                "msg": "team_id is invalid."
-                            },
-                        },
-                    )
-            else:
-                if emails:
-                    for email in emails:
-                        user = User()
-                        user.email = email
-                        user.username = email
-                        user.first_name = email
-                        user.last_name = email
-                        user.password = password
-                        user.agency = agency
-                        user.is_agent = True
-                        user.is_active = serializer.data.get('is_active')
-                        common_parameters = CommonParameters()
-                        common_parameters.currency = common_parameter.currency
-                        common_parameters.date_type = common_parameter.date_type
-                        common_parameters.booking_enabled = common_parameter.booking_enabled
-                        common_parameters.virtual_interlining = common_parameter.virtual_interlining
-                        common_parameters.exclude_carriers = common_parameter.exclude_carriers
-                        common_parameters.save()
-                        user.common_parameters = common_parameters
-                        user.save()
-        elif request.user.is_team_lead:
-            team = request.user.team
-            agency = team.agency
-            common_parameter = agency.common_parameters
-            if emails:
-                for email in emails:
-                    user = User()
-                    user.email = email
-                    user.username = email
-                    user.first_name = email
-                    user.last_name = email
-                    user.team = team
-                    user.agency = agency
-                    user.password = password
-                    user.is_active = serializer.data.get('is_active')
-                    user.is_agent = True
-                    common_parameters = CommonParameters()
-                    common_parameters.currency = common_parameter.currency
-                    common_parameters.date_type = common_parameter.date_type
-                    common_parameters.booking_enabled = common_parameter.booking_enabled
-                    common_parameters.virtual_interlining = common_parameter.virtual_interlining
-                    common_parameters.exclude_carriers = common_parameter.exclude_carriers
-                    common_parameters.save()
-                    user.common_parameters = common_parameters
-                    user.save()
-        else:
-            try:
-                agency = Agency.objects.get(id=serializer.data.get('agency_id'))
-                common_parameter = agency.common_parameters
-
-                if serializer.data.get('team_id'):
-                    try:
-                        team = Team.objects.get(id=serializer.data.get('team_id'))
-                        if emails:
-                            for email in emails:
-                                user = User()
-                                user.email = email
-                                user.username = email
-                                user.first_name = email
-                                user.last_name = email
-                                user.agency = agency
-                                user.team = team
-                                user.password = password
-                                user.is_agent = True
-                                user.is_active = serializer.data.get('is_active')
-                                common_parameters = CommonParameters()
-                                common_parameters.currency = common_parameter.currency
-                                common_parameters.date_type = common_parameter.date_type
-                                common_parameters.booking_enabled = common_parameter.booking_enabled
-                                common_parameters.virtual_interlining = common_parameter.virtual_interlining
-                                common_parameters.exclude_carriers = common_parameter.exclude_carriers
-                                common_parameters.save()
-                                user.common_parameters = common_parameters
-                                user.save()
-                    except ObjectDoesNotExist:
-                        return Response(
-                            {
-                                "result": False,
-                                "data": {
-                                    "msg": "team_id is invalid."
-                                },
-                            },
-                        )
-                elif emails:
-                    for email in emails:
-                        user = User()
-                        user.email = email
-                        user.username = email
-                        user.first_name = email
-                        user.last_name = email
-                        user.agency = agency
-                        user.password = password
-                        user.is_active = serializer.data.get('is_active')
-                        user.is_agent = True
-                        common_parameters = CommonParameters()
-                        common_parameters.currency = common_parameter.currency
-                        common_parameters.date_type = common_parameter.date_type
-                        common_parameters.booking_enabled = common_parameter.booking_enabled
-                        common_parameters.virtual_interlining = common_parameter.virtual_interlining
-                        common_parameters.exclude_carriers = common_parameter.exclude_carriers
-                        common_parameters.save()
-                        user.common_parameters = common_parameters
-                        user.save()
-            except ObjectDoesNotExist:
-                return Response(
-                    {
-                        "result": False,
-                        "data": {
-                            "msg": "agency_id is invalid."
-                        },
+        data = serializer.validated_data
+        agency, team, error = bulk_target(request.user, data.get('agency_id'), data.get('team_id'))
+        if error:
+            return Response(
+                {
+                    "result": False,
+                    "data": {
+                        "msg": error
                     },
-                )
+                },
+            )
+
+        job = UserImportJob.objects.create(
+            agency=agency,
+            team=team,
+            created_by=request.user,
+            source=data['file'],
+            file_format=import_format(data['file'].name, data.get('file_format')),
+            password=data['password'],
+            is_active=data['is_active'],
+        )
+        return Response({"result": True, "data": {"job": serialize_job(job)}}, status=status.HTTP_201_CREATED)
+
+
+class UserImportJobMixin(object):
+    permission_classes = IsTeamLead,
+
+    def get_job(self, request, pk):
+        jobs = UserImportJob.objects.all()
+        if request.user.is_superuser:
+            pass
+        elif request.user.is_agency_admin:
+            jobs = jobs.filter(agency_id=request.user.agency_id)
+        else:
+            jobs = jobs.filter(created_by=request.user)
+        try:
+            return jobs.get(pk=pk)
+        except ObjectDoesNotExist:
+            return None
 
+    def not_found(self):
         return Response(
             {
-                "result": True,
-                "data": {
-                    "msg": "Bulk Users created."
-                },
+                "result": False,
+                "errorCode": 1,
+                "errorMsg": "Invalid job id."
             },
+            status=status.HTTP_404_NOT_FOUND
         )
 
 
+class UserImportDetailView(UserImportJobMixin, GenericAPIView):
+
+    def get(self, request, pk):
+        job = self.get_job(request, pk)
+        if job is None:
+            return self.not_found()
+        return Response({"result": True, "data": {"job": serialize_job(job)}})
+
+
+class UserImportCancelView(UserImportJobMixin, GenericAPIView):
+
+    def post(self, request, pk):
+        job = self.get_job(request, pk)
+        if job is None:
+            return self.not_found()
+        cancelled = cancel_job(job)
+        job.refresh_from_db()
+        return Response({"result": cancelled, "data": {"job": serialize_job(job)}})
+
+
+class UserImportErrorsView(UserImportJobMixin, GenericAPIView):
+
+    def get(self, request, pk):
+        job = self.get_job(request, pk)
+        if job is None:
+            return self.not_found()
+        rows = stream_csv(job.errors.order_by('row_number'), ('row_number', 'email', 'status'))
+        response = StreamingHttpResponse(rows, content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="import_%d_errors.csv"' % job.pk
+        return response
+
+
 class EmailCheckView(GenericAPIView):
 
     def get(self, request):
@@ -637,6 +551,23 @@ class EmailCheckView(GenericAPIView):
         return Response({"result": True})
 
 
+class EmailBatchCheckView(GenericAPIView):
+    permission_classes = IsTeamLead,
+    serializer_class = EmailBatchCheckSerializer
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(
+            {
+                "result": True,
+                "data": {
+                    "available": availability(User.objects.all(), 'email', serializer.validated_data['emails'])
+                }
+            }
+        )
+
+
 class UserUpdateView(GenericAPIView):
     serializer_class = UserUpdateSerializer
 
@@ -645,6 +576,7 @@ class UserUpdateView(GenericAPIView):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         user = serializer.validated_data['user']
+        previous_agency_id = user.agency_id
         user.first_name = serializer.data.get('first_name')
         user.last_name = serializer.data.get('last_name')
         user.email = serializer.data.get('email')
@@ -659,6 +591,8 @@ class UserUpdateView(GenericAPIView):
             agency_id = user.agency.id
             agency_name = user.agency.name
         user.save()
+        invalidate_user_credentials(user.id)
+        bump_claims_version(previous_agency_id, user.agency_id)
         if not user.team:
             team_id = None
             team_name = None
@@ -696,9 +630,11 @@ class UserAchieveView(GenericAPIView):
             if user.is_active:
                 user.is_active = False
                 user.save()
+                revocation_list.revoke_user(user.id)
             else:
                 user.is_active = True
                 user.save()
+            invalidate_user_credentials(user.id)
             return Response(
                 {
                     "result": True,